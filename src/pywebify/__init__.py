@@ -10,6 +10,3 @@ __url__ = 'https://github.com/endangeredoxen/pywebify'
 from pywebify.template import *  # noqa
 from pywebify.pywebify import *  # noqa
 from pywebify.config import *  # noqa
-
-
-make_setup()  # noqa -> from pywebify.py
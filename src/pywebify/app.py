@@ -0,0 +1,398 @@
+############################################################################
+# app.py
+#   On-demand report application (WSGI and ASGI) that builds the report of
+#   each directory of a file share on its first request
+############################################################################
+__author__ = 'Steve Nicholes'
+__copyright__ = 'Copyright (C) 2017 Steve Nicholes'
+__license__ = 'GPLv3'
+__url__ = 'https://github.com/endangeredoxen/pywebify'
+
+import os
+import asyncio
+import email.utils
+import mimetypes
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Union
+from urllib.parse import quote
+from pywebify.html import EmptyReportError
+from pywebify.manifest import BuildManifest
+from pywebify.pywebify import PyWebify, script_data
+from pywebify.server import CHUNK, STATUS
+db = breakpoint
+
+
+class DirectoryReport(PyWebify):
+    def __init__(self, base_path: Union[str, Path], asset_path: Union[str, Path],
+                 previous: Union['DirectoryReport', None] = None, **kwargs):
+        """Report of a single directory built in memory for ReportApp.
+
+        The report html and the json data scripts are kept in memory instead of being written to the directory and
+        the setup files (css, javascript and images) go to asset_path, which is shared by every directory of the app.
+        Rst files are listed as html and compiled on first view.  The scanned directories and their mtimes are
+        tracked by an in-memory BuildManifest: the report is stale as soon as one of them changes and the listings of
+        the unchanged directories are reused by the next build.
+
+        Args:
+            base_path: directory of the report
+            asset_path: shared directory for the setup files
+            previous: stale report of the same directory whose directory listings can be reused
+            kwargs: PyWebify keyword arguments
+
+        """
+        self.asset_path = Path(asset_path)
+        self.checked = time.monotonic()
+        self.previous = previous
+        self.scripts = {}
+        kwargs = dict(kwargs, incremental=True, lazy_rst=True, make=False, open=False, serve=False)
+        PyWebify.__init__(self, base_path, **kwargs)
+        self.previous = None  # do not keep a chain of old reports alive
+
+        # Build the report in memory
+        self.build_navbar()
+        self.build_scripts()
+        self.get_html()
+        self.html = self.get_html_template()
+        self.body = self.html.write().encode('utf-8')
+
+    def set_manifest(self, kwargs: dict):
+        """Track the scanned directories in memory starting from the listings of the previous report."""
+        self.manifest = BuildManifest(self.asset_path / 'manifest.json')
+        if self.previous is not None:
+            self.manifest.old = self.previous.manifest.data
+
+    def set_output_paths(self):
+        """Send the setup files to the shared asset directory."""
+        PyWebify.set_output_paths(self)
+        self.setup_path = self.asset_path
+
+    def stale(self) -> bool:
+        """Check if an entry was added to, removed from or renamed in any scanned directory since the build."""
+        self.checked = time.monotonic()
+        for path, entry in self.manifest.data['dirs'].items():
+            try:
+                if os.stat(path).st_mtime_ns != entry['mtime']:
+                    return True
+            except OSError:
+                return True
+
+        return False
+
+    def write_script_data(self, name: str, var: str, data: Union[dict, list]):
+        """Keep the json data scripts in memory (served by ReportApp)."""
+        self.scripts[name] = script_data(var, data).encode('utf-8')
+
+
+class ReportApp():
+    def __init__(self, root: Union[str, Path], **kwargs):
+        """Web application that serves a PyWebify report for every directory below root.
+
+        Nothing is built up front.  The first request for a directory url scans the directory and renders its report
+        and json data scripts in memory; the shared css, javascript and image files are built once to asset_path.  Rst
+        files are compiled to html on their first view (or after the rst changes).  Reports are kept in an LRU cache
+        of cache_size directories and rebuilt once the mtime of any scanned directory changes (checked at most every
+        refresh seconds).  Concurrent requests that need the same report or rst file wait for a single build instead
+        of scanning the directory again.  All other urls are served as files from root.
+
+        Use the object itself as a WSGI application or the asgi method as an ASGI application.
+
+        Args:
+            root: top-level directory of the file share
+
+        Keyword Args:
+            asset_path (str): directory for the shared setup files; defaults to a new temporary directory
+            cache_size (int): maximum number of directory reports kept in memory; defaults to 32
+            refresh (float): minimum number of seconds between the mtime checks of a cached report; defaults to 1
+            kwargs: other keyword arguments are passed to PyWebify (i.e., config)
+
+        """
+        self.root = os.path.realpath(str(root))
+        self.asset_path = kwargs.pop('asset_path', None)
+        if self.asset_path is None:
+            self.asset_path = tempfile.mkdtemp(prefix='pywebify_')
+        self.asset_path = os.path.realpath(str(self.asset_path))
+        self.cache_size = kwargs.pop('cache_size', 32)
+        self.refresh = kwargs.pop('refresh', 1)
+        self.setup_subdir = str(kwargs.pop('setup_subdir', 'pywebify'))
+        self.kwargs = dict(kwargs, setup_subdir=self.setup_subdir)
+
+        self.lock = threading.Lock()
+        self.pending = {}  # {key: Future} of the builds in progress
+        self.reports = OrderedDict()  # {directory: DirectoryReport}
+        self.setup_built = False
+
+    def __call__(self, environ: dict, start_response):
+        """WSGI entry point."""
+        method = environ.get('REQUEST_METHOD', 'GET')
+        path = environ.get('PATH_INFO', '/').encode('latin-1').decode('utf-8', 'replace')
+        status, headers, body = self.respond(method, path, environ.get('SCRIPT_NAME', ''))
+        start_response(f'{status} {STATUS[status]}', headers)
+        if method == 'HEAD':
+            return [b'']
+        if isinstance(body, bytes):
+            return [body]
+
+        wrapper = environ.get('wsgi.file_wrapper')
+        if wrapper is not None:
+            return wrapper(open(body, 'rb'), CHUNK)
+        return self.read_file(body)
+
+    async def asgi(self, scope: dict, receive, send):
+        """ASGI entry point (the report builds run in the default thread pool)."""
+        if scope['type'] == 'lifespan':
+            while True:
+                message = await receive()
+                if message['type'] == 'lifespan.startup':
+                    await send({'type': 'lifespan.startup.complete'})
+                elif message['type'] == 'lifespan.shutdown':
+                    await send({'type': 'lifespan.shutdown.complete'})
+                    return
+        if scope['type'] != 'http':
+            return
+
+        loop = asyncio.get_event_loop()
+        method = scope.get('method', 'GET')
+        status, headers, body = await loop.run_in_executor(None, self.respond, method, scope.get('path', '/'),
+                                                           scope.get('root_path', ''))
+        await send({'type': 'http.response.start', 'status': status,
+                    'headers': [(k.lower().encode('latin-1'), v.encode('latin-1')) for k, v in headers]})
+        if method == 'HEAD' or isinstance(body, bytes):
+            await send({'type': 'http.response.body', 'body': body if method != 'HEAD' else b''})
+            return
+
+        chunks = self.read_file(body)
+        while True:
+            chunk = await loop.run_in_executor(None, next, chunks, b'')
+            await send({'type': 'http.response.body', 'body': chunk, 'more_body': chunk != b''})
+            if chunk == b'':
+                break
+
+    def build_report(self, path: str, previous: Union[DirectoryReport, None]) -> DirectoryReport:
+        """Build the report of a directory and add it to the cache (run once per directory by run_once).
+
+        Args:
+            path: directory path
+            previous: stale cached report of the directory, if any
+
+        Returns:
+            DirectoryReport
+        """
+        with self.lock:
+            current = self.reports.get(path)
+        if current is not None and current is not previous:
+            # Rebuilt by another request in the meantime
+            return current
+
+        report = DirectoryReport(path, self.asset_path, previous, **self.kwargs)
+        if not self.setup_built:
+            self.run_once(('setup', ), report.build_setup)
+            self.setup_built = True
+
+        with self.lock:
+            self.reports[path] = report
+            self.reports.move_to_end(path)
+            while len(self.reports) > self.cache_size:
+                self.reports.popitem(last=False)
+
+        return report
+
+    def compile_rst(self, html: str) -> bool:
+        """Make sure the html file of an rst file is built and up to date.
+
+        The rst is compiled with a cached report that lists it (or the report of its directory).
+
+        Args:
+            html: html file path
+
+        Returns:
+            True if the html file exists
+        """
+        rst = os.path.splitext(html)[0] + '.rst'
+        try:
+            mtime = os.stat(rst).st_mtime_ns
+        except OSError:
+            return os.path.isfile(html)
+        try:
+            if os.stat(html).st_mtime_ns >= mtime:
+                return True
+        except OSError:
+            pass
+
+        directory = os.path.dirname(html)
+        report = None
+        while report is None and directory.startswith(self.root):
+            with self.lock:
+                report = self.reports.get(directory)
+            if report is not None and rst not in report.files.rst_files:
+                report = None
+            directory = os.path.dirname(directory) if directory != self.root else ''
+        if report is None:
+            report = self.report(os.path.dirname(html))
+
+        return self.run_once(('rst', rst), report.compile_rst, rst)
+
+    def error(self, status: int, message: str = '') -> [int, list, bytes]:
+        """Make an error response."""
+        body = (message if message else STATUS[status]).encode('utf-8')
+        return status, [('Content-Type', 'text/plain; charset=utf-8'), ('Content-Length', str(len(body)))], body
+
+    def expired(self, report: DirectoryReport) -> bool:
+        """Check if a cached report is stale (at most once every refresh seconds)."""
+        if time.monotonic() - report.checked < self.refresh:
+            return False
+        return report.stale()
+
+    def file_response(self, path: str, root: str) -> [int, list, Union[bytes, str]]:
+        """Make the response for a file.
+
+        Args:
+            path: file path
+            root: directory the file must be inside of once any symlinks are resolved
+
+        Returns:
+            status code, headers, and the file path (or an error message)
+        """
+        if not self.inside(path, root):
+            return self.error(404)
+        try:
+            st = os.stat(path)
+        except OSError:
+            return self.error(404)
+        if not os.path.isfile(path):
+            return self.error(404)
+        content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        headers = [('Content-Type', content_type), ('Content-Length', str(st.st_size)),
+                   ('Last-Modified', email.utils.formatdate(st.st_mtime, usegmt=True))]
+
+        return 200, headers, path
+
+    def inside(self, path: str, root: str) -> bool:
+        """Check if a path is inside of a directory after resolving any symlinks.
+
+        Args:
+            path: file or directory path
+            root: real path of the directory
+
+        Returns:
+            True if the path is root or inside of it
+        """
+        path = os.path.realpath(path)
+        return path == root or path.startswith(root + os.sep)
+
+    def read_file(self, path: str):
+        """Read a file in chunks.
+
+        Args:
+            path: file path
+
+        Yields:
+            bytes
+        """
+        with open(path, 'rb') as input:
+            for chunk in iter(lambda: input.read(CHUNK), b''):
+                yield chunk
+
+    def report(self, path: str) -> DirectoryReport:
+        """Get the report of a directory, building it on the first request or if it is stale.
+
+        Args:
+            path: directory path
+
+        Returns:
+            DirectoryReport
+        """
+        with self.lock:
+            report = self.reports.get(path)
+            if report is not None:
+                self.reports.move_to_end(path)
+        if report is not None and not self.expired(report):
+            return report
+
+        return self.run_once(('report', path), self.build_report, path, report)
+
+    def respond(self, method: str, path: str, prefix: str = '') -> [int, list, Union[bytes, str]]:
+        """Make the response to a request.
+
+        Args:
+            method: http method
+            path: decoded url path
+            prefix: url path where the app is mounted (for redirects)
+
+        Returns:
+            status code, list of (header, value) tuples, and the body (bytes or a file path to stream)
+        """
+        if method not in ['GET', 'HEAD']:
+            return self.error(405)
+        parts = [f for f in path.split('/') if f not in ['', '.']]
+        if any(f == '..' or '\\' in f or '\0' in f for f in parts):
+            return self.error(404)
+
+        # Setup files and the json data scripts of a directory report (setup_subdir/css|img|js/name directly under
+        # the report directory)
+        if len(parts) >= 3 and parts[-3] == self.setup_subdir and parts[-2] in ['css', 'img', 'js']:
+            directory = os.path.join(self.root, *parts[:-3])
+            rest = parts[-2:]
+            if not self.inside(directory, self.root):
+                return self.error(404)
+            if rest[0] == 'css' and rest[1].endswith('.js') and os.path.isdir(directory):
+                report = self.report(directory)
+                for name, text in report.scripts.items():
+                    if rest[1] == f'{report.report_filename}_{name}.js':
+                        return 200, [('Content-Type', 'application/javascript; charset=utf-8'),
+                                     ('Content-Length', str(len(text))), ('Cache-Control', 'no-cache')], text
+            return self.file_response(os.path.join(self.asset_path, *rest), self.asset_path)
+
+        # Directory report
+        full_path = os.path.join(self.root, *parts)
+        if not self.inside(full_path, self.root):
+            return self.error(404)
+        if os.path.isdir(full_path):
+            if not path.endswith('/'):
+                # Relative links in the report need the trailing slash
+                return 301, [('Location', quote(prefix + path + '/')), ('Content-Length', '0')], b''
+            try:
+                report = self.report(full_path)
+            except EmptyReportError as e:
+                return self.error(404, str(e))
+            return 200, [('Content-Type', 'text/html; charset=utf-8'), ('Content-Length', str(len(report.body))),
+                         ('Cache-Control', 'no-cache')], report.body
+
+        # Rst files are compiled on first view
+        if full_path.lower().endswith('.html') and not self.compile_rst(full_path):
+            return self.error(404)
+
+        return self.file_response(full_path, self.root)
+
+    def run_once(self, key: tuple, func, *args):
+        """Run a function once for all concurrent callers with the same key.
+
+        The first caller runs func and the others wait for and share its result (or exception).
+
+        Args:
+            key: build identifier
+            func: function to run
+            args: function arguments
+
+        Returns:
+            func result
+        """
+        with self.lock:
+            future = self.pending.get(key)
+            owner = future is None
+            if owner:
+                future = self.pending[key] = Future()
+        if owner:
+            try:
+                future.set_result(func(*args))
+            except Exception as e:
+                future.set_exception(e)
+            finally:
+                with self.lock:
+                    del self.pending[key]
+
+        return future.result()
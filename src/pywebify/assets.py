@@ -0,0 +1,250 @@
+############################################################################
+# assets.py
+#   Deployment of the static report files (javascript, css and images) to
+#   the report setup directory or a shared content-addressed asset store
+############################################################################
+__author__ = 'Steve Nicholes'
+__copyright__ = 'Copyright (C) 2017 Steve Nicholes'
+__license__ = 'GPLv3'
+__url__ = 'https://github.com/endangeredoxen/pywebify'
+
+import os
+import hashlib
+import re
+import shutil
+import stat
+import threading
+from pathlib import Path
+from typing import Union
+db = breakpoint
+
+FICLONE = 0x40049409  # linux ioctl to share the data blocks of a file (btrfs, xfs, ...)
+HASHES = {}  # {absolute path: ((mtime, size), content hash)}
+HASH_LOCK = threading.Lock()
+MODES = ['copy', 'hardlink', 'symlink', 'reflink']
+STORED = re.compile(r'\.[0-9a-f]{16}\.[A-Za-z0-9]+$')  # file names in an asset store
+
+
+def content_hash(path: Union[str, Path], st: Union[os.stat_result, None] = None) -> str:
+    """Hash the contents of a file, reusing the last hash of the file while its mtime and size are unchanged.
+
+    Args:
+        path: file path
+        st: os.stat result of the file if already known
+
+    Returns:
+        sha1 hex digest
+    """
+    path = os.path.abspath(path)
+    if st is None:
+        st = os.stat(path)
+    signature = (st.st_mtime_ns, st.st_size)
+    with HASH_LOCK:
+        entry = HASHES.get(path)
+    if entry is not None and entry[0] == signature:
+        return entry[1]
+
+    value = file_hash(path)
+    with HASH_LOCK:
+        HASHES[path] = (signature, value)
+
+    return value
+
+
+def deploy_file(src: Union[str, Path], dest: Union[str, Path], mode: str = 'copy', check: str = 'mtime',
+                src_stat: Union[os.stat_result, None] = None) -> bool:
+    """Put a single asset file in place unless an identical file is already there.
+
+    The file is written to a temporary name and moved over dest so a report being viewed (or built by another
+    process) never sees a partial file.  Modes that the filesystem does not support (i.e., hardlinks across devices,
+    symlinks without privileges on Windows, reflinks outside of btrfs/xfs) fall back to a plain copy.
+
+    Args:
+        src: source file path
+        dest: destination file path (the parent directory must exist)
+        mode: "copy", "hardlink", "symlink" or "reflink" (copy-on-write clone)
+        check: how to compare a copied file with the source: "mtime" (size and mtime) or "hash" (size and contents)
+        src_stat: os.stat result of src if already known
+
+    Returns:
+        True if the file was written, False if dest was already up to date
+    """
+    src = os.fspath(src)
+    dest = os.fspath(dest)
+    if src_stat is None:
+        src_stat = os.stat(src)
+    if identical(src, src_stat, dest, mode, check):
+        return False
+
+    temp = f'{dest}.{os.getpid()}.{threading.get_ident()}.tmp'
+    try:
+        link(src, temp, mode)
+        os.replace(temp, dest)
+    finally:
+        if os.path.lexists(temp):
+            os.remove(temp)
+
+    return True
+
+
+def deploy_files(files: list, mode: str = 'copy', check: str = 'mtime', workers: int = 1) -> list:
+    """Deploy multiple asset files, optionally in parallel.
+
+    Args:
+        files: list of (src, dest) or (src, dest, src os.stat result) tuples
+        mode: deployment mode (see deploy_file)
+        check: copied file comparison (see deploy_file)
+        workers: number of threads used to check and write the files
+
+    Returns:
+        list of the dest paths that were written
+    """
+    for dd in set(os.path.dirname(os.fspath(f[1])) for f in files):
+        os.makedirs(dd, exist_ok=True)
+
+    def deploy(ff):
+        try:
+            return deploy_file(ff[0], ff[1], mode, check, ff[2] if len(ff) > 2 else None)
+        except OSError as e:
+            print(f'failed to deploy "{ff[0]}": {e}')
+            return False
+
+    if workers is None or workers <= 1 or len(files) <= 1:
+        written = [deploy(f) for f in files]
+    else:
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=min(workers, len(files))) as pool:
+            written = list(pool.map(deploy, files))
+
+    return [f[1] for f, ww in zip(files, written) if ww]
+
+
+def file_hash(path: Union[str, Path]) -> str:
+    """Hash the contents of a file.
+
+    Args:
+        path: file path
+
+    Returns:
+        sha1 hex digest
+    """
+    sha = hashlib.sha1()
+    with open(path, 'rb') as input:
+        for chunk in iter(lambda: input.read(1 << 20), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def identical(src: str, src_stat: os.stat_result, dest: str, mode: str, check: str) -> bool:
+    """Check if a deployed file already matches its source.
+
+    Args:
+        src: source file path
+        src_stat: os.stat result of src
+        dest: destination file path
+        mode: deployment mode (see deploy_file)
+        check: copied file comparison (see deploy_file)
+
+    Returns:
+        True if dest does not need to be rewritten
+    """
+    try:
+        dest_stat = os.lstat(dest)
+    except OSError:
+        return False
+
+    if stat.S_ISLNK(dest_stat.st_mode):
+        return mode == 'symlink' and os.readlink(dest) == os.path.abspath(src)
+    if os.path.samestat(src_stat, dest_stat):
+        return True
+    # Regular files are copies (link modes fall back to a copy where links are not supported)
+    if dest_stat.st_size != src_stat.st_size:
+        return False
+    if check == 'hash':
+        return file_hash(src) == file_hash(dest)
+
+    return dest_stat.st_mtime_ns == src_stat.st_mtime_ns
+
+
+def link(src: str, dest: str, mode: str):
+    """Create dest from src with the requested deployment mode or fall back to a copy.
+
+    Copies keep the mtime of the source so the next build can skip them.
+
+    Args:
+        src: source file path
+        dest: new file path
+        mode: deployment mode (see deploy_file)
+    """
+    if mode == 'hardlink':
+        try:
+            os.link(src, dest)
+            return
+        except OSError:
+            pass
+    elif mode == 'symlink':
+        try:
+            os.symlink(os.path.abspath(src), dest)
+            return
+        except OSError:
+            pass
+    elif mode == 'reflink' and reflink(src, dest):
+        shutil.copystat(src, dest)
+        return
+
+    shutil.copy2(src, dest)
+
+
+def reflink(src: str, dest: str) -> bool:
+    """Clone a file with copy-on-write (no data is copied on filesystems that support it).
+
+    Args:
+        src: source file path
+        dest: new file path
+
+    Returns:
+        True if the file was cloned
+    """
+    try:
+        import fcntl
+    except ImportError:
+        return False
+    with open(src, 'rb') as input, open(dest, 'wb') as output:
+        try:
+            fcntl.ioctl(output.fileno(), FICLONE, input.fileno())
+            return True
+        except OSError:
+            return False
+
+
+def store_file(src: Union[str, Path], store: Union[str, Path], mode: str = 'copy',
+               src_stat: Union[os.stat_result, None] = None) -> str:
+    """Add a file to a shared content-addressed asset store.
+
+    The stored file is named by its content hash (i.e., "jquery.min.0123456789abcdef.js") so it is written once for
+    any number of reports and can be cached by browsers forever.  Hardlinks and symlinks are not used in a store
+    (they would change with the source file) so those modes are stored as copies.
+
+    Args:
+        src: source file path
+        store: asset store directory
+        mode: deployment mode (see deploy_file)
+        src_stat: os.stat result of src if already known
+
+    Returns:
+        name of the file in the store
+    """
+    src = os.fspath(src)
+    if src_stat is None:
+        src_stat = os.stat(src)
+    stem, ext = os.path.splitext(os.path.basename(src))
+    name = f'{stem}.{content_hash(src, src_stat)[:16]}{ext}'
+    dest = os.path.join(store, name)
+    try:
+        if os.stat(dest).st_size == src_stat.st_size:
+            return name
+    except OSError:
+        os.makedirs(store, exist_ok=True)
+    deploy_file(src, dest, mode if mode == 'reflink' else 'copy', 'hash', src_stat)
+
+    return name
@@ -17,12 +17,11 @@ except:  # noqa
 import os
 import re
 import ast
-import pdb
 from typing import Union
 from pathlib import Path
 oswalk = os.walk
 osjoin = os.path.join
-db = pdb.set_trace
+db = breakpoint
 
 
 def str_2_dtype(val: str, ignore_list: bool = False) -> Union[str, int, float, list]:
@@ -0,0 +1,237 @@
+############################################################################
+# fileindex.py
+#   Compact, pandas-free index of the files in a report
+############################################################################
+__author__ = 'Steve Nicholes'
+__copyright__ = 'Copyright (C) 2017 Steve Nicholes'
+__license__ = 'GPLv3'
+__url__ = 'https://github.com/endangeredoxen/pywebify'
+
+import os
+from pathlib import Path
+from typing import Union
+osjoin = os.path.join
+db = breakpoint
+
+COLUMNS = ['full_path', 'rel_path', 'html_path', 'ext', 'base_path']
+
+
+class FileRecord():
+    __slots__ = ['base_path', 'dir', 'rel_dir', 'parts', 'name', 'relative', 'companion']
+
+    def __init__(self, base_path: str, dir: str, rel_dir: str, parts: tuple, name: str, relative: bool = True,
+                 companion: bool = False):
+        """Single file in the report.
+
+        Only the file name is unique to each record; the directory strings and the parts tuple are shared by every
+        file in the same directory.  The full, relative and html paths are built on request.
+
+        Args:
+            base_path: top-level directory of the scan
+            dir: full path of the directory containing the file
+            rel_dir: path of the directory relative to base_path
+            parts: directory names used to build the sidebar tree (equivalent to the old subdirN columns)
+            name: file name with extension
+            relative: use a relative html_path instead of a file uri
+            companion: an html file with the same name exists in the same directory (shown with the file)
+
+        """
+        self.base_path = base_path
+        self.dir = dir
+        self.rel_dir = rel_dir
+        self.parts = parts
+        self.name = name
+        self.relative = relative
+        self.companion = companion
+
+    def __repr__(self):
+        return f'FileRecord({self.full_path!r})'
+
+    @property
+    def ext(self) -> str:
+        """File extension without the leading dot."""
+        return os.path.splitext(self.name)[1][1:]
+
+    @ext.setter
+    def ext(self, value: str):
+        self.name = f'{self.filename}.{value}'
+
+    @property
+    def filename(self) -> str:
+        """File name without the extension."""
+        return os.path.splitext(self.name)[0]
+
+    @property
+    def filename_ext(self) -> str:
+        """File extension without the leading dot (legacy column name)."""
+        return self.ext
+
+    @property
+    def full_path(self) -> str:
+        """Absolute path of the file."""
+        return osjoin(self.dir, self.name)
+
+    @property
+    def html_path(self) -> str:
+        """Path used for links in the report."""
+        if self.relative:
+            return self.rel_path
+        return Path(self.full_path).as_uri()
+
+    @property
+    def link(self) -> str:
+        """Legacy html link string for the file."""
+        return '''<A onmouseover="div_switch(' ''' + self.html_path + \
+               '''')" onclick="HREF=window.open(' ''' + self.html_path + \
+               '''')"href="javascript:void(0)">''' + self.filename + '''</A><br>'''
+
+    @property
+    def rel_path(self) -> str:
+        """Path of the file relative to base_path."""
+        return osjoin(self.rel_dir, self.name) if self.rel_dir else self.name
+
+    def key(self) -> tuple:
+        """Tuple of all values used to identify duplicate records."""
+        return (self.base_path, self.dir, self.rel_dir, self.parts, self.name, self.relative)
+
+    def to_dict(self) -> dict:
+        """Convert the record to the legacy row format."""
+        row = {f: getattr(self, f) for f in COLUMNS}
+        for i, ss in enumerate(self.parts):
+            row[f'subdir{i}'] = ss
+        row['filename_ext'] = self.filename_ext
+        row['filename'] = self.filename
+        return row
+
+
+class DirNode():
+    __slots__ = ['name', 'dir', 'path', 'children', 'files', 'order']
+
+    def __init__(self, name: str = '', dir: str = ''):
+        """Directory node of the file tree trie.
+
+        Args:
+            name: directory name
+            dir: full path of the directory
+
+        """
+        self.name = name
+        self.dir = dir
+        # Html path of the directory in the report (precomputed by the report builder)
+        self.path = None
+        self.children = {}
+        self.files = []
+        # Order of the child directories and the block of files (None) by first appearance
+        self.order = []
+
+    def add(self, record: FileRecord, depth: int = 0) -> 'DirNode':
+        """Add a file record below this node.
+
+        Args:
+            record: file to add
+            depth: index in record.parts of the first directory below this node
+
+        Returns:
+            node containing the record
+        """
+        node = self
+        for i, name in enumerate(record.parts[depth:], depth):
+            child = node.children.get(name)
+            if child is None:
+                # The directory of a node is the record directory less any deeper parts
+                dir = record.dir
+                for _ in range(len(record.parts) - 1 - i):
+                    dir = os.path.dirname(dir)
+                child = node.children[name] = DirNode(name, dir)
+                node.order += [name]
+            node = child
+        if len(node.files) == 0:
+            node.order += [None]
+        node.files += [record]
+
+        return node
+
+    def records(self):
+        """Iterate over all files below this node in sidebar order.
+
+        Yields:
+            FileRecord
+        """
+        for name in self.order:
+            if name is None:
+                yield from self.files
+            else:
+                yield from self.children[name].records()
+
+    def nodes(self):
+        """Iterate over all directories below this node (depth-first, in list order).
+
+        Yields:
+            DirNode
+        """
+        stack = [self.children[f] for f in reversed(self.order) if f is not None]
+        while stack:
+            node = stack.pop()
+            yield node
+            stack += [node.children[f] for f in reversed(node.order) if f is not None]
+
+
+class FileIndex():
+    def __init__(self, records: Union[list, None] = None):
+        """Ordered collection of FileRecords with a trie view of the directory structure.
+
+        Args:
+            records: initial list of FileRecords
+
+        """
+        self.records = list(records) if records else []
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return FileIndex(self.records[idx])
+        return self.records[idx]
+
+    def __iter__(self):
+        return iter(self.records)
+
+    def __len__(self):
+        return len(self.records)
+
+    def extend(self, records: Union[list, 'FileIndex']):
+        """Add records to the end of the index."""
+        self.records += list(records)
+
+    def to_dataframe(self):
+        """Convert the index to the legacy pandas DataFrame format (requires pandas).
+
+        Returns:
+            DataFrame with one row per file and 'nan' in unused subdirN columns
+        """
+        import pandas as pd
+        depth = max([len(f.parts) for f in self.records] + [0])
+        columns = COLUMNS + [f'subdir{i}' for i in range(depth)] + ['filename_ext', 'filename', 'link']
+        rows = []
+        for rr in self.records:
+            row = rr.to_dict()
+            row['link'] = rr.link
+            rows += [row]
+
+        return pd.DataFrame(rows, columns=columns).fillna('nan')
+
+    def tree(self) -> DirNode:
+        """Build the directory trie of the indexed files.
+
+        Returns:
+            root node
+        """
+        root = DirNode()
+        node, parts = None, None
+        for rr in self.records:
+            # Records from the same directory are contiguous and share one parts tuple so only the first one of
+            # each directory has to walk down from the root
+            if node is not None and (rr.parts is parts or rr.parts == parts):
+                node.files += [rr]
+            else:
+                node, parts = root.add(rr), rr.parts
+
+        return root
@@ -1,7 +1,7 @@
 #################################################################################
 # html.py
 #
-#   Classes and functions for reading and outputting html-based files using pandas
+#   Classes and functions for reading and outputting html-based files
 #
 ##################################################################################
 __author__ = 'Steve Nicholes'
@@ -10,21 +10,59 @@ __license__ = 'GPLv3'
 __url__ = 'https://github.com/endangeredoxen/pywebify'
 
 import os
-import pandas as pd
-import pdb
+import fnmatch
+import hashlib
+import io
 import re
-from xml.dom import minidom
+import shutil
+import sys
 from xml.etree import ElementTree
-import numpy as np
-from docutils import core
-from natsort import natsorted
+from pywebify.fileindex import DirNode, FileIndex, FileRecord
+from pywebify.template import populate
 from pathlib import Path
 from typing import Union
 osjoin = os.path.join
-db = pdb.set_trace
+db = breakpoint
 
 
-def convert_rst(file_name: Union[str, Path], stylesheet: Union[str, None] = None):
+def compile_exclude(patterns: Union[list, str, None], prune: bool = False) -> Union[re.Pattern, None]:
+    """Combine a list of exclusion patterns into a single compiled regex.
+
+    Plain patterns are substrings matched anywhere in a path.  Patterns starting with "glob:" are shell-style
+    wildcards (fnmatch) matched against the entire path (i.e., "glob:*.tmp") and patterns starting with "re:" are
+    regular expressions searched for anywhere in the path.
+
+    Args:
+        patterns: exclusion patterns
+        prune: only keep the patterns that match every path inside a directory if they match the directory path
+            with a trailing separator (plain patterns and globs ending in "*") so whole directories can be skipped
+
+    Returns:
+        compiled regex that matches any excluded path or None if there are no patterns
+    """
+    if not patterns:
+        return None
+    if isinstance(patterns, str):
+        patterns = [patterns]
+
+    regex = []
+    for pp in dict.fromkeys(str(f) for f in patterns):
+        if pp.startswith('glob:'):
+            if not prune or pp.endswith('*'):
+                regex += [r'\A' + fnmatch.translate(pp[5:])]
+        elif pp.startswith('re:'):
+            if not prune:
+                regex += [f'(?:{pp[3:]})']
+        elif pp != '':
+            regex += [re.escape(pp)]
+    if len(regex) == 0:
+        return None
+
+    return re.compile('|'.join(regex))
+
+
+def convert_rst(file_name: Union[str, Path], stylesheet: Union[str, None] = None,
+                cache_dir: Union[str, Path, None] = None, subs: Union[list, None] = None):
     """Converts single rst files to html.
 
     Adapted from Andrew Pinion's solution @ http://halfcooked.com/blog/2010/06/01/generating-html-versions-of-
@@ -33,6 +71,10 @@ def convert_rst(file_name: Union[str, Path], stylesheet: Union[str, None] = None
     Args:
         file_name: name of rst file to convert to html
         stylesheet: optional path to a stylesheet
+        cache_dir: optional directory of previously compiled html files; if the rst source, stylesheet and docutils
+            version match a cached file, it is copied to the destination without running docutils
+        subs: optional list of css replacement string dicts applied in order to the html before it is written (the
+            compile cache keeps the html without replacements)
     """
     # Configure any css stylesheets
     if not stylesheet:
@@ -43,67 +85,226 @@ def convert_rst(file_name: Union[str, Path], stylesheet: Union[str, None] = None
         stylesheet = [str(f) for f in stylesheet]
         settings_overrides = {'stylesheet_path': stylesheet}
 
-    # Build the rst with docutils
-    source = open(file_name, 'r')
+    # Check the compile cache
+    with open(file_name, 'r') as input:
+        rst = input.read()
     file_dest = os.path.splitext(file_name)[0] + '.html'
-    destination = open(file_dest, 'w')
-    core.publish_file(source=source, destination=destination, writer_name='html', settings_overrides=settings_overrides)
-    source.close()
-    destination.close()
+    if cache_dir:
+        cached = Path(cache_dir) / f'{rst_cache_key(file_name, stylesheet, rst)}.html'
+        if cached.exists():
+            if not subs:
+                shutil.copyfile(cached, file_dest)
+            else:
+                with open(cached, 'r') as input:
+                    html = input.read()
+                with open(file_dest, 'w') as output:
+                    output.write(populate_rst(html, subs))
+            os.utime(cached)  # mark as recently used for eviction
+            return
+
+    # Build the rst with docutils in memory
+    from docutils import core
+    html = core.publish_string(source=rst, source_path=str(file_name), destination_path=file_dest,
+                               writer_name='html', settings_overrides=settings_overrides)
+    html = fix_rst_paths(rst, html.decode('utf-8'))
+
+    # Write the html and store it in the compile cache
+    with open(file_dest, 'w') as output:
+        output.write(populate_rst(html, subs))
+    if cache_dir:
+        os.makedirs(cache_dir, exist_ok=True)
+        temp = cached.with_suffix(f'.{os.getpid()}.tmp')
+        with open(temp, 'w') as output:
+            output.write(html)
+        os.replace(temp, cached)
+
+
+def convert_rst_files(file_names: list, stylesheet: Union[str, None] = None, jobs: int = 1,
+                      cache_dir: Union[str, Path, None] = None, cache_size: Union[int, None] = None,
+                      subs: Union[dict, None] = None) -> dict:
+    """Convert multiple rst files to html, optionally in parallel.
 
-    # Fix issue with spaces in figure path and links
-    with open(file_name, 'r') as input:
-        rst = input.readlines()
-
-    with open(file_dest, 'r') as input:
-        html = input.read()
-
-    # Case of figures
-    imgs = [f for f in rst if 'figure::' in f]
-    for img in imgs:
-        img = img.replace('.. figure:: ', '').replace('\n', '').lstrip()
-        if ' ' in img:
-            img_ns = img.replace(' ', '').replace('\\', '')
-            idx = html.find(img_ns) - 5
-            if idx < 0:
-                continue
-            old = 'alt="%s" src="%s"' % (img_ns, img_ns)
-            new = 'alt="%s" src="%s"' % (img, img)
-            html = html[0:idx] + new + html[idx+len(old):]
-
-            with open(file_dest, 'w') as output:
-                output.write(html)
-
-    # Case of substituted images
-    imgs = [f for f in rst if 'image::' in f]
-    for img in imgs:
-        img = img.replace('.. image:: ', '').replace('\n', '').lstrip()
-        if ' ' in img:
-            img_ns = img.replace(' ', '').replace('\\', '')
-            idx = html.find(img_ns) - 5
-            if idx < 0:
+    Args:
+        file_names: rst files to convert
+        stylesheet: optional path to a stylesheet
+        jobs: number of processes to use; 1 converts the files serially in this process
+        cache_dir: optional compile cache directory (see convert_rst)
+        cache_size: maximum number of files to keep in the compile cache
+        subs: optional dict of {file name: list of css replacement string dicts} (see convert_rst)
+
+    Returns:
+        dict of {file name: error message} for any files that failed to convert
+    """
+    errors = {}
+    subs = subs if subs else {}
+    if jobs is None or jobs <= 1 or len(file_names) <= 1:
+        for ff in file_names:
+            try:
+                convert_rst(ff, stylesheet=stylesheet, cache_dir=cache_dir, subs=subs.get(ff))
+            except Exception as e:
+                errors[ff] = repr(e)
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=min(jobs, len(file_names))) as pool:
+            futures = {ff: pool.submit(convert_rst, ff, stylesheet, cache_dir, subs.get(ff)) for ff in file_names}
+            for ff, future in futures.items():
+                try:
+                    future.result()
+                except Exception as e:
+                    errors[ff] = repr(e)
+
+    if cache_dir and cache_size:
+        evict_rst_cache(cache_dir, cache_size)
+
+    return errors
+
+
+def evict_rst_cache(cache_dir: Union[str, Path], max_entries: int):
+    """Remove the least recently used files from the rst compile cache.
+
+    Args:
+        cache_dir: compile cache directory
+        max_entries: maximum number of cached html files to keep
+    """
+    try:
+        entries = [f for f in os.scandir(cache_dir) if f.name.endswith('.html')]
+    except OSError:
+        return
+    if len(entries) <= max_entries:
+        return
+    entries.sort(key=lambda f: f.stat().st_mtime_ns)
+    for ee in entries[:len(entries) - max_entries]:
+        try:
+            os.remove(ee.path)
+        except OSError:
+            pass
+
+
+def escape(text: str) -> str:
+    """Escape special characters in html text or attribute values (same as minidom).
+
+    Args:
+        text: raw string
+
+    Returns:
+        escaped string
+    """
+    return text.replace('&', '&amp;').replace('<', '&lt;').replace('"', '&quot;').replace('>', '&gt;')
+
+
+def fix_rst_paths(rst: str, html: str) -> str:
+    """Restore the spaces that docutils strips from figure, image and link paths.
+
+    All of the paths are replaced in a single regex pass over the html.
+
+    Args:
+        rst: rst source text
+        html: html compiled from the rst source
+
+    Returns:
+        updated html
+    """
+    paths = {}
+    for line in rst.splitlines():
+        # Case of figures and substituted images
+        for directive in ['.. figure:: ', '.. image:: ']:
+            if directive.strip() in line:
+                img = line.replace(directive, '').lstrip()
+                if ' ' in img:
+                    paths[img.replace(' ', '').replace('\\', '')] = img
+
+        # Case of links
+        if '>`_' in line:
+            try:
+                link = re.search('<(.*)>`_', line).group(1)
+            except:  # noqa
+                print('invalid rst link: "%s"' % line)
                 continue
-            old = 'alt="%s" src="%s"' % (img_ns, img_ns)
-            new = 'alt="%s" src="%s"' % (img, img)
-            html = html[0:idx] + new + html[idx+len(old):]
+            if ' ' in link:
+                paths[link.replace(' ', '')] = link
 
-            with open(file_dest, 'w') as output:
-                output.write(html)
+    if len(paths) == 0:
+        return html
 
-    # Case of links
-    links = [f for f in rst if ">`_" in f]
-    for link in links:
+    pattern = re.compile('((?:alt|src|href)=")(%s)"' % '|'.join(re.escape(f) for f in paths.keys()))
+    return pattern.sub(lambda m: f'{m.group(1)}{paths[m.group(2)]}"', html)
+
+
+def populate_rst(html: str, subs: Union[list, None]) -> str:
+    """Apply css replacement strings to the html of a compiled rst file.
+
+    Args:
+        html: compiled html
+        subs: list of replacement string dicts applied in order
+
+    Returns:
+        updated html
+    """
+    for ss in (subs if subs else []):
+        html = populate(html, ss)
+    return html
+
+
+def rst_cache_key(file_name: Union[str, Path], stylesheet: Union[list, None] = None,
+                  source: Union[str, None] = None) -> str:
+    """Make the compile cache key for an rst file.
+
+    The key is a hash of the rst source, its path (which docutils includes in error messages), the contents of any
+    stylesheets (which docutils embeds in the html) and the docutils version.  Stylesheets that cannot be read are
+    keyed by their path only (docutils reports them as an error in the html).
+
+    Args:
+        file_name: rst file path
+        stylesheet: optional list of stylesheet paths
+        source: rst source text if already read
+
+    Returns:
+        hex digest string
+    """
+    from importlib.metadata import version
+    key = hashlib.sha256()
+    key.update(version('docutils').encode('utf-8'))
+    key.update(str(Path(file_name).absolute()).encode('utf-8'))
+    if source is None:
+        with open(file_name, 'r') as input:
+            source = input.read()
+    key.update(source.encode('utf-8'))
+    for ss in (stylesheet if stylesheet else []):
+        key.update(str(ss).encode('utf-8'))
         try:
-            link = re.search("<(.*)>`_", link).group(1)
-        except:  # noqa
-            print('invalid rst link: "%s"' % link)
-            continue
-        if ' ' in link:
-            link_ns = link.replace(' ', '')
-            idx = html.find(link_ns)
-            html = html[0:idx] + link + html[idx+len(link_ns):]
-            with open(file_dest, 'w') as output:
-                output.write(html)
+            with open(ss, 'rb') as input:
+                key.update(input.read())
+        except OSError:
+            key.update(b'\0')
+
+    return key.hexdigest()
+
+
+def scandir(path: Union[str, Path]) -> [list, list, dict]:
+    """List the contents of a single directory with os.scandir.
+
+    Args:
+        path: directory to list
+
+    Returns:
+        list of subdirectory names (symlinked directories are skipped like os.walk)
+        list of file names
+        dict of {file name: os.DirEntry} to reuse the stat data cached by scandir
+    """
+    dirs, files, entries = [], [], {}
+    try:
+        with os.scandir(path) as it:
+            for ee in it:
+                if ee.is_dir():
+                    if not ee.is_symlink():
+                        dirs += [ee.name]
+                else:
+                    files += [ee.name]
+                    entries[ee.name] = ee
+    except OSError:
+        pass
+
+    return dirs, files, entries
 
 
 class EmptyReportError(Exception):
@@ -122,15 +323,40 @@ class Dir2HTML():
 
         Keyword Args:
             build_rst (bool): convert rst files to html. Defaults to True.
-            exclude (list): names of files to exclude from the UL
+            compact (bool): write compact sidebar markup with the path of
+                each link stored once in a data-path attribute instead of
+                inline onmouseover/onclick handlers. Defaults to False.
+            exclude (list): names of files to exclude from the UL; plain
+                names match any part of the path, "glob:" and "re:"
+                prefixes select wildcard or regex patterns
             from_file (bool): make the report from a text file containing a
                 list of directories and files or just scan the
                 base_path directory
+            lazy_rst (bool): list rst files as their html files without
+                converting them; the html is built on first view (see
+                PyWebify.compile_rst).  Defaults to False.
+            manifest (BuildManifest): build manifest from a previous build used
+                to skip unchanged directory listings and rst conversions
+            max_depth (int): maximum number of subdirectory levels below
+                base_path to scan; None scans the entire tree.  Defaults to
+                None.
             natsort (bool): use natural (human) sorting on the file list
             onclick (bool): enable click to open for files listed in the UL
             onmouseover (bool): enable onmouseover viewing for files listed in
                 the UL
+            rst_cache_dir (str): directory of the rst compile cache; None
+                disables the cache.  Defaults to None.
+            rst_cache_size (int): maximum number of files in the rst
+                compile cache.  Defaults to 500.
             rst_css (str): path to css file for rst files
+            rst_jobs (int): number of processes used to convert rst files.
+                Defaults to 1 (serial).
+            rst_subs (function): returns a dict of {rst path: list of css
+                replacement string dicts} for a list of rst paths; the
+                replacements are applied as each html file is written
+            scan_workers (int): number of threads used to list directories
+                concurrently (helpful on high-latency network filesystems).
+                Defaults to 1 (serial scan).
             show_ext (bool): show/hide file extension in the file list
             use_relative (bool):  use relative paths.  Defaults to True.
         """
@@ -138,17 +364,31 @@ class Dir2HTML():
         if isinstance(self.base_path, str):
             self.base_path = Path(self.base_path)
         self.build_rst = kwargs.get('build_rst', True)
+        self.compact = kwargs.get('compact', False)
         self.exclude = kwargs.get('exclude', [])
-        self.files = []
+        self.exclude_re = compile_exclude(self.exclude)
+        self.prune_re = compile_exclude(self.exclude, prune=True)
+        self.files = FileIndex()
         self.from_file = kwargs.get('from_file', False)
+        self.lazy_rst = kwargs.get('lazy_rst', False)
+        self.manifest = kwargs.get('manifest', None)
+        self.max_depth = kwargs.get('max_depth', None)
         self.merge_html = kwargs.get('merge_html', True)
         self.natsort = kwargs.get('natsort', True)
         self.onclick = kwargs.get('onclick', None)
         self.onmouseover = kwargs.get('onmouseover', None)
         self.rst_css = kwargs.get('rst_css', None)
+        self.rst_cache_dir = kwargs.get('rst_cache_dir', None)
+        self.rst_cache_size = kwargs.get('rst_cache_size', 500)
+        self.rst_errors = {}
         self.rst_files = []
+        self.rst_jobs = kwargs.get('rst_jobs', 1)
+        self.rst_reused = []
+        self.rst_subs = kwargs.get('rst_subs', None)
+        self.scan_workers = kwargs.get('scan_workers', 1)
         self.show_ext = kwargs.get('show_ext', False)
-        self.ul = '<ul>'
+        self.stats = {}
+        self.tree = None
         self.use_relative = kwargs.get('use_relative', True)
 
         self.ext = ext
@@ -162,24 +402,63 @@ class Dir2HTML():
         if len(self.files) == 0:
             raise EmptyReportError(f'No files found with extension(s): {", ".join(self.ext)}.  Report is empty!')
 
-        if self.build_rst and 'rst' in self.files.ext.str.lower().values:
+        if self.build_rst and any(f.ext.lower() == 'rst' for f in self.files):
             self.make_rst()
         self.filter()
         self.drop_duplicates()
-        self.nan_to_str()
-        self.make_links()
         self.make_ul()
 
-    def df_to_xml(self, df: pd.DataFrame, parent_node: Union[ElementTree.Element, None] = None, parent_name: str = ''):
-        """Builds an xml structure from a DataFrame.
+    @property
+    def ul(self) -> str:
+        """Html list of the file index with the default indent (rendered on every access)."""
+        return self.write_ul(io.StringIO()).getvalue()
+
+    def tree_to_json(self, tree: Union[DirNode, None] = None, parent_path: str = '') -> list:
+        """Convert the directory trie to a compact json-serializable list for the lazy-loaded sidebar.
+
+        Files are stored as their file name if the link path is the parent folder path + "/" + the file name and as
+        [file name, link path] otherwise.  Folders are stored as {"n": name, "c": [children]} plus a "p" key with
+        the folder path if it cannot be built from the parent path the same way.
 
         Args:
-            df:  directory structure
+            tree: directory structure; defaults to self.tree
+            parent_path: html path of the parent folder (used for recursion)
+
+        Returns:
+            list of folder and file items in sidebar order
+        """
+        if tree is None:
+            tree = self.tree
+        prefix = f'{parent_path}/' if parent_path else ''
+
+        items = []
+        for name in tree.order:
+            if name is None:
+                for ff in tree.files:
+                    path = ff.html_path
+                    items += [ff.name if path == prefix + ff.name else [ff.name, path]]
+            else:
+                sub = tree.children[name]
+                path = sub.path if sub.path is not None else self.folder_path(sub.dir)
+                item = {'n': name}
+                if path != prefix + name:
+                    item['p'] = path
+                item['c'] = self.tree_to_json(sub, path)
+                items += [item]
+
+        return items
+
+    def tree_to_xml(self, tree: DirNode, parent_node: Union[ElementTree.Element, None] = None,
+                    parent_name: str = ''):
+        """Builds an xml structure from the directory trie.
+
+        Args:
+            tree:  directory structure
             parent_node:  parent node in the xml structure
             parent_name:  string name of the node
 
         Returns:
-            node:  ElementTree xml representation of df
+            node:  ElementTree xml representation of tree
         """
         def node_for_value(name, value, parent_node, parent_name, dir=False, set_id=None):
             """creates the <li><input><label>...</label></input></li> elements.
@@ -187,6 +466,8 @@ class Dir2HTML():
             """
 
             node = ElementTree.SubElement(parent_node, 'li')
+            if dir:
+                node.set('class', 'collapsed')
             child = ElementTree.SubElement(node, 'A')
             if set_id is not None:
                 child.set('id', set_id)
@@ -201,56 +482,49 @@ class Dir2HTML():
             child.text = name
             return node
 
-        subdirs = [f for f in df.columns if 'subdir' in f]
-
         if parent_node is None:
             node = ElementTree.Element('ul')
         else:
             node = ElementTree.SubElement(parent_node, 'ul')
         node.set('id', 'collapse')
 
-        if len(subdirs) > 0:
-            groups = df.groupby(subdirs[0], sort=False)
-            for i, (n, g) in enumerate(groups):
-                del g[subdirs[0]]
-                if n == 'nan':
-                    for row in range(0, len(g)):
-                        node_for_value(g.filename.iloc[row], g.html_path.iloc[row], node,
-                                       parent_name, set_id='image_link')
-                else:
-                    try:
-                        idx = g.full_path.apply(lambda x: len(x.split(os.path.sep))).idxmin()
-                    except:  # noqa
-                        idx = g.full_path.apply(lambda x: len(x.split(os.path.sep))).argmin()
-                    folder_path = os.sep.join(g.loc[idx, 'full_path'].split(os.sep)[0:-1])
-                    if self.use_relative:
-                        folder_path = folder_path.replace(str(self.base_path) + os.sep, '')
-                        folder_path = folder_path.replace(os.sep, '/')
-                    else:
-                        folder_path = Path(folder_path).as_uri()
-                    child = node_for_value(n, folder_path, node, parent_name, dir=True)
-                    self.df_to_xml(g, child, n)
-
-        else:
-            for row in range(0, len(df)):
-                node_for_value(df.filename.iloc[row], df.html_path.iloc[row], node, parent_name, set_id='image_link')
+        for name in tree.order:
+            if name is None:
+                for ff in tree.files:
+                    node_for_value(ff.filename, ff.html_path, node, parent_name, set_id='image_link')
+            else:
+                sub = tree.children[name]
+                folder_path = sub.path if sub.path is not None else self.folder_path(sub.dir)
+                child = node_for_value(name, folder_path, node, parent_name, dir=True)
+                self.tree_to_xml(sub, child, name)
 
         return node
 
+    def companion_paths(self) -> list:
+        """List the html paths of the report files that have a companion html file to show with them."""
+        return [f.html_path for f in self.files if f.companion]
+
     def drop_duplicates(self):
         """Remove duplicate values and for image + html, reduce to one link."""
         # Drop complete duplicates
-        self.files = self.files.drop_duplicates().reset_index(drop=True)
+        self.files = FileIndex({f.key(): f for f in self.files}.values())
 
         # Condense html + image file pairs
         if self.merge_html:
-            subdir_cols = [f for f in self.files.columns if 'subdir' in f]
-            dups = self.files[subdir_cols + ['filename']].duplicated()
-            dup_idx = list(dups[dups].index)
-            for ii, idx in enumerate(dup_idx):
-                if self.files.loc[idx, 'ext'] != 'html':
-                    dup_idx[ii] = idx - 1
-            self.files = self.files.drop(dup_idx).reset_index(drop=True)
+            stems = {}
+            for ff in self.files:
+                stems.setdefault((ff.parts, ff.filename), []).append(ff)
+            drop = set()
+            for group in stems.values():
+                if len(group) > 1 and any(f.ext != 'html' for f in group):
+                    drop.update(id(f) for f in group if f.ext == 'html')
+            self.files = FileIndex([f for f in self.files if id(f) not in drop])
+
+    def folder_path(self, dir: str) -> str:
+        """Make the html path of a directory in the list."""
+        if self.use_relative:
+            return dir.replace(str(self.base_path) + os.sep, '').replace(os.sep, '/')
+        return Path(dir).as_uri()
 
     def get_files(self, from_file: bool):
         """Get the files for the report.
@@ -258,153 +532,456 @@ class Dir2HTML():
         Args:
             from_file:  use a text file to identify the directories and files to be used in the report
         """
-        def paths_to_str(temp: dict) -> dict:
-            """Convert pathlibs to str.
-
-            Args:
-                temp: dict of filename keys
-
-            Returns:
-                updated dict
-            """
-            keys = ['full_path', 'rel_path', 'html_path', 'base_path', 'filename']
-            for k in keys:
-                temp[k] = str(temp[k])
-            return temp
-
         if from_file:
             # Build the list from a text file
             with open(self.base_path, 'r') as input:
                 files = input.readlines()
-            temp = pd.DataFrame()
+            temp = FileIndex()
             files = [f.strip('\n') for f in files if len(f) > 0]
             for f in files:
                 self.base_path = Path(f).resolve()
                 self.get_files(False)
-                if len(self.files) > 0:
-                    temp = pd.concat([temp, self.files])
-            self.files = temp.reset_index(drop=True)
+                temp.extend(self.files)
+            self.files = temp
 
         else:
             # Walk the base_path to identify all the files for the report
-            self.files = []
-            for dir_name, subdir_list, file_list in os.walk(self.base_path):
-                file_list = [f for f in file_list if f.split('.')[-1].lower() in self.ext]
-                for fname in file_list:
-                    fname = Path(fname)
-                    temp = {}
-                    temp['full_path'] = (self.base_path / dir_name / fname).resolve()
-                    temp['rel_path'] = Path(str(temp['full_path']).replace(str(self.base_path) + os.sep, ''))
-                    if self.use_relative:
-                        temp['html_path'] = temp['rel_path']  # need to verify on Windows
-                    else:
-                        temp['html_path'] = Path(temp['full_path']).as_uri()
-                    temp['ext'] = fname.suffix[1:]
-                    if self.from_file:
-                        top = str(self.base_path).split(os.sep)[-1]
-                        subdirs = str(temp['full_path']).replace(str(self.base_path).replace(top, ''), '').split(os.sep)
-                    else:
-                        subdirs = str(temp['full_path']).replace(str(self.base_path)+os.sep, '').split(os.sep)
-                    temp['base_path'] = self.base_path
-                    for i, s in enumerate(subdirs[:-1]):
-                        temp[f'subdir{i}'] = s
-                    temp['filename_ext'] = temp['full_path'].suffix[1:]
-                    temp['filename'] = os.path.splitext(subdirs[-1])[0]
-                    temp = paths_to_str(temp)
-                    self.files += [temp]
-
-            # Discrete files will not get os.walked so add manually (only applies to file_list=True)
+            self.files = FileIndex(self.scan(self.base_path))
+
+            # Discrete files will not get scanned so add manually (only applies to file_list=True)
             if not self.base_path.is_dir() and self.base_path.exists():
-                temp = {}
-                temp['full_path'] = self.base_path.resolve()
-                temp['rel_path'] = self.base_path
-                if self.use_relative:
-                    temp['html_path'] = temp['rel_path']  # need to verify on Windows
-                else:
-                    temp['html_path'] = Path(temp['full_path']).as_uri()
-                temp['ext'] = self.base_path.suffix[1:]
-                if temp['ext'] not in self.ext:
+                if self.base_path.suffix[1:] not in self.ext:
                     # if ext is not in the list of allowed, drop it
                     return
-                temp['base_path'] = self.base_path
-                for i, s in enumerate(self.base_path.parts[:-1]):
-                    temp[f'subdir{i}'] = s
-                temp['filename_ext'] = self.base_path.suffix[1:]
-                temp['filename'] = os.path.splitext(self.base_path.name)[0]
-                temp = paths_to_str(temp)
-                self.files += [temp]
+                full_path = self.base_path.resolve()
+                companion = self.base_path.suffix.lower() != '.html' and full_path.with_suffix('.html').exists()
+                self.files.extend([FileRecord(str(self.base_path), str(full_path.parent), str(self.base_path.parent),
+                                              self.base_path.parts[:-1], full_path.name, self.use_relative,
+                                              companion)])
 
             # Exit if no files found
             if len(self.files) == 0:
                 return
 
-            # Make list into DataFrame
-            self.files = pd.DataFrame(self.files)
-
             # Sort the files
-            if self.natsort and len(self.files) > 0:
-                temp = self.files.set_index('full_path')
-                self.files = temp.reindex(index=natsorted(temp.index)).reset_index()
+            if self.natsort:
+                from natsort import natsorted
+                self.files = FileIndex(natsorted(self.files, key=lambda f: f.full_path))
 
             # Add top level files below the folder list
-            folders = self.files.loc[self.files.subdir0.map(str) != 'nan']
-            top_level_files = self.files.loc[self.files.subdir0.map(str) == 'nan']
-            self.files = pd.concat([folders, top_level_files]).reset_index(drop=True)
+            folders = [f for f in self.files if len(f.parts) > 0]
+            top_level_files = [f for f in self.files if len(f.parts) == 0]
+            self.files = FileIndex(folders + top_level_files)
 
-    def filter(self):
-        """Filter out any files on the exclude list."""
+    def file_tokens(self, content: bool = False) -> dict:
+        """Make a short cache-busting token for each report file.
+
+        The token changes whenever the file changes so the browser can cache the files of the report between views.
+        By default the token is a hash of the mtime and size recorded by the scan.  With content=True it is a hash of
+        the file contents, which is reused from the build manifest for any file with the same mtime and size as the
+        last build.  Files without scan stats (i.e., reused directory listings) and content hashes are processed by a
+        thread pool.  Html files are shown without a token and are skipped.
+
+        Args:
+            content: hash the file contents instead of the mtime and size
 
-        for ex in self.exclude:
-            self.files = self.files[~self.files.full_path.str.contains(ex, regex=False)]
+        Returns:
+            dict of the file html paths in sidebar order and the matching tokens ('' for skipped or unreadable files)
+        """
+        def token(ff):
+            st = self.stats.get(ff.full_path)
+            if st is None:
+                try:
+                    st = os.stat(ff.full_path)
+                except OSError:
+                    return ''
+                st = [st.st_mtime_ns, st.st_size]
+            if not content:
+                return hashlib.sha1(f'{st[0]}:{st[1]}'.encode('utf-8')).hexdigest()[:8]
+
+            if self.manifest is not None:
+                value = self.manifest.content_hash(ff.full_path, st)
+                if value is not None:
+                    return value
+            sha = hashlib.sha1()
+            try:
+                with open(ff.full_path, 'rb') as input:
+                    for chunk in iter(lambda: input.read(1 << 20), b''):
+                        sha.update(chunk)
+            except OSError:
+                return ''
+            value = sha.hexdigest()[:8]
+            if self.manifest is not None:
+                self.manifest.record_hash(ff.full_path, st, value)
+            return value
+
+        records = list(self.tree.records() if self.tree is not None else self.files)
+        todo = [f for f in records if f.ext.lower() != 'html']
+        if content or any(f.full_path not in self.stats for f in todo):
+            from concurrent.futures import ThreadPoolExecutor
+            with ThreadPoolExecutor() as pool:
+                values = dict(zip(map(id, todo), pool.map(token, todo)))
+        else:
+            values = {id(f): token(f) for f in todo}
 
-        self.files = self.files.reset_index(drop=True)
+        return {'paths': [f.html_path for f in records], 'tokens': [values.get(id(f), '') for f in records]}
+
+    def filter(self):
+        """Filter out any files on the exclude list."""
+        if self.exclude_re is None:
+            return
+        search = self.exclude_re.search
+        self.files = FileIndex([f for f in self.files if not search(f.full_path)])
 
     def href(self, value):
         """Make the auto-open href."""
         return os.path.splitext('?id=%s' % value.replace(' ', '%20'))[0]
 
     def make_rst(self):
-        """Build html files from rst files."""
-        self.rst = self.files[self.files.ext == 'rst']
-        idx_to_drop = []
-        for i, f in self.rst.iterrows():
-            # Convert the rst to html
-            convert_rst(f['full_path'], stylesheet=self.rst_css)
-
-            # Preserve a list of rst files that were compiled
-            self.rst_files += [self.files.iloc[i]['full_path']]
-
-            # Update the file list to reflect the new html file extension
-            self.files.iloc[i]['ext'] = 'html'
-            self.files.iloc[i]['filename'] = self.files.iloc[i]['filename'].replace('rst', 'html')
-            self.files.iloc[i]['filename_ext'] = self.files.iloc[i]['filename_ext'].replace('rst', 'html')
-            self.files.iloc[i]['full_path'] = self.files.iloc[i]['full_path'].replace('rst', 'html')
-            self.files.iloc[i]['html_path'] = self.files.iloc[i]['html_path'].replace('rst', 'html')
-            self.files.iloc[i]['rel_path'] = self.files.iloc[i]['rel_path'].replace('rst', 'html')
-
-            # Check for same-named images
-            for ext in [v for v in self.ext if v != 'html']:
-                idx = self.files.query('full_path==r"%s"' % self.files.iloc[i]['full_path'].replace('html', ext)).index
-                if len(idx) > 0:
-                    idx_to_drop += list(idx)
-
-        self.files = self.files.drop(idx_to_drop).reset_index(drop=True)
-
-    def make_links(self):
-        """Build the HTML links."""
-        self.files['link'] = '''<A onmouseover="div_switch(' ''' + self.files.html_path.map(str) + \
-                             '''')" onclick="HREF=window.open(' ''' + self.files.html_path.map(str) + \
-                             '''')"href="javascript:void(0)">''' + self.files.filename.map(str) + \
-                             '''</A><br>'''
+        """Build html files from rst files.
+
+        The rst files are converted in a process pool if rst_jobs > 1.  Conversion errors are collected in
+        self.rst_errors and reported without stopping the build; failed files are left in the file list as rst.
+        """
+        self.rst = [f for f in self.files if f.ext == 'rst']
+        todo = []
+        subs = self.rst_subs([f.full_path for f in self.rst]) if self.rst_subs and not self.lazy_rst else {}
+        for f in (self.rst if not self.lazy_rst else []):
+            # Skip the rsts that are unchanged since the last incremental build
+            if self.manifest is not None and self.manifest.unchanged(*self.rst_manifest_entry(f.full_path, subs)):
+                self.rst_reused += [f.full_path]
+            else:
+                todo += [f.full_path]
+
+        # Convert the rst to html
+        self.rst_errors = convert_rst_files(todo, stylesheet=self.rst_css, jobs=self.rst_jobs,
+                                            cache_dir=self.rst_cache_dir, cache_size=self.rst_cache_size, subs=subs)
+        for ff, err in self.rst_errors.items():
+            print(f'failed to convert rst file "{ff}": {err}')
+        if self.manifest is not None:
+            for ff in todo:
+                if ff not in self.rst_errors:
+                    self.manifest.record(*self.rst_manifest_entry(ff, subs))
+
+        # Preserve a list of rst files that were compiled and update the file list to the new html file extension
+        same = set()
+        for f in self.rst:
+            if f.full_path in self.rst_errors:
+                continue
+            self.rst_files += [f.full_path]
+            f.ext = 'html'
+            f.companion = False
+            same.update(osjoin(f.dir, f'{f.filename}.{ext}') for ext in self.ext if ext != 'html')
+
+        # Drop same-named images
+        self.files = FileIndex([f for f in self.files if f.full_path not in same])
 
     def make_ul(self):
-        """Convert the DataFrame of paths and files to xml."""
-        element = self.df_to_xml(self.files)
-        xml = ElementTree.tostring(element)
-        xml = minidom.parseString(xml)
-        self.ul = xml.toprettyxml(indent='  ')
-        self.ul = self.ul.replace('<?xml version="1.0" ?>\n', '')
-
-    def nan_to_str(self):
-        """Replace NaN with a string version."""
-        self.files = self.files.replace(np.nan, 'nan')
+        """Build the directory trie of the html list (the list itself is written on demand by write_ul)."""
+        self.tree = self.files.tree()
+        for node in self.tree.nodes():
+            node.path = self.folder_path(node.dir)
+
+    def is_ext(self, fname: str) -> bool:
+        """Check if a file name has one of the report file extensions."""
+        return fname.split('.')[-1].lower() in self.ext
+
+    def list_tree(self, top: str) -> dict:
+        """List every directory below top using a thread pool.
+
+        Each subdirectory is submitted to the pool as soon as its parent listing completes so sibling directories are
+        listed concurrently.  The stat data of the report files is also fetched by the worker threads.  Pruned
+        subdirectories are removed from the listings and never submitted.
+
+        Args:
+            top: starting directory
+
+        Returns:
+            dict of {directory path: listdir result}
+        """
+        def listdir(path):
+            dirs, files, entries = self.listdir(path)
+            for name, entry in entries.items():
+                if self.is_ext(name):
+                    try:
+                        entry.stat()  # cached by the DirEntry
+                    except OSError:
+                        pass
+            return dirs, files, entries
+
+        from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+        listings = {}
+        with ThreadPoolExecutor(max_workers=self.scan_workers) as pool:
+            pending = {pool.submit(listdir, top): (top, 0)}
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    dir_name, depth = pending.pop(future)
+                    dirs, files, entries = future.result()
+                    dirs = self.prune(dir_name, dirs, depth)
+                    listings[dir_name] = dirs, files, entries
+                    for ff in dirs:
+                        path = osjoin(dir_name, ff)
+                        pending[pool.submit(listdir, path)] = (path, depth + 1)
+
+        return listings
+
+    def listdir(self, path: str) -> [list, list, dict]:
+        """List a single directory, using the build manifest listing if available.
+
+        Args:
+            path: directory to list
+
+        Returns:
+            list of subdirectory names
+            list of file names
+            dict of {file name: os.DirEntry} (empty if the listing was reused from the manifest)
+        """
+        if self.manifest is not None:
+            return self.manifest.listdir(path)
+        return scandir(path)
+
+    def scan(self, base_path: Union[str, Path]) -> list:
+        """Walk a directory tree with os.scandir and build the file records for the report.
+
+        The base path is resolved once and the relative paths and sidebar directory parts of each file are built from
+        the walk stack rather than by resolving and splitting every file path.  All files in a directory share the
+        same directory strings and parts tuple.  Files with an html file of the same name in their directory are
+        flagged as having a companion.  The mtime and size of each file is stored in self.stats.  If
+        scan_workers > 1, the directories are listed concurrently first and then visited in the same order as the
+        serial scan.  Excluded subdirectories and directories deeper than max_depth are pruned from the walk and are
+        never listed.
+
+        Args:
+            base_path: top-level directory to scan
+
+        Returns:
+            list of FileRecords
+        """
+        base = Path(base_path).resolve()
+        base_str = str(base)
+        base_path = str(base_path)
+        top = (base.name, ) if self.from_file else ()
+
+        parallel = self.scan_workers is not None and self.scan_workers > 1
+        if parallel:
+            # Listings from the pool are already pruned
+            listdir = self.list_tree(base_str).pop
+        else:
+            listdir = self.listdir
+
+        records = []
+        stack = [(base_str, '', ())]
+        while stack:
+            dir_name, rel_dir, parts = stack.pop()
+            dirs, files, entries = listdir(dir_name)
+            tree_parts = top + parts
+            names = None
+            for fname in files:
+                if not self.is_ext(fname):
+                    continue
+                record = FileRecord(base_path, dir_name, rel_dir, tree_parts, fname, self.use_relative)
+                records += [record]
+                if record.ext.lower() != 'html':
+                    if names is None:
+                        names = set(files)
+                    record.companion = f'{record.filename}.html' in names
+
+                if fname in entries:
+                    try:
+                        st = entries[fname].stat()
+                        self.stats[record.full_path] = [st.st_mtime_ns, st.st_size]
+                    except OSError:
+                        pass
+
+            if not parallel:
+                dirs = self.prune(dir_name, dirs, len(parts))
+            stack += [(osjoin(dir_name, f), osjoin(rel_dir, f) if rel_dir else f, parts + (sys.intern(f), ))
+                      for f in reversed(dirs)]
+
+        return records
+
+    def prune(self, dir_name: str, dirs: list, depth: int) -> list:
+        """Remove the subdirectories of a directory that should not be scanned.
+
+        A subdirectory is pruned if it is below max_depth or if its path with a trailing separator matches one of
+        the exclude patterns that also match every path inside of it (see compile_exclude).  Patterns anchored at
+        the end of a path (i.e., "glob:*.png" or "re:_old$") only exclude files so they never prune a directory.
+
+        Args:
+            dir_name: full path of the parent directory
+            dirs: subdirectory names
+            depth: number of levels of dir_name below the base path
+
+        Returns:
+            list of subdirectory names to scan
+        """
+        if self.max_depth is not None and depth >= int(self.max_depth):
+            return []
+        if self.prune_re is None:
+            return dirs
+
+        search = self.prune_re.search
+        keep = []
+        for ff in dirs:
+            if not search(osjoin(dir_name, ff) + os.sep):
+                keep += [ff]
+
+        return keep
+
+    def rst_manifest_entry(self, rst: str, subs: Union[dict, None] = None) -> [str, list, list, str]:
+        """Get the build manifest key, inputs, outputs and digest for converting an rst file.
+
+        Args:
+            rst: path to the rst file
+            subs: dict of {rst path: list of css replacement string dicts}
+
+        Returns:
+            manifest key
+            list of input files
+            list of output files
+            digest of the css replacement strings
+        """
+        from pywebify.manifest import digest
+        subs = subs.get(rst) if subs else None
+        return f'rst:{rst}', [rst] + self.rst_stylesheets(), [os.path.splitext(rst)[0] + '.html'], \
+            digest(subs) if subs else ''
+
+    def rst_stylesheets(self) -> list:
+        """List the stylesheet paths used for rst conversion."""
+        if not self.rst_css:
+            return []
+        if not isinstance(self.rst_css, list):
+            return [str(self.rst_css)]
+        return [str(f) for f in self.rst_css]
+
+    def search_index(self, n: int = 3) -> dict:
+        """Make an n-gram index of the file paths for the sidebar search filter.
+
+        Files are numbered in sidebar order.  Each lowercase n-gram of a relative file path maps to the sorted
+        numbers of the files that contain it, stored as the difference from the previous number to keep the index
+        small.  Queries shorter than n are answered by scanning the paths.
+
+        Args:
+            n: n-gram length
+
+        Returns:
+            dict of the n-gram length, the lowercase paths and the n-gram postings
+        """
+        paths = [f.rel_path.replace(os.sep, '/').lower() for f in self.tree.records()]
+        grams = {}
+        last = {}
+        for idx, path in enumerate(paths):
+            for gram in dict.fromkeys(path[i:i + n] for i in range(len(path) - n + 1)):
+                grams.setdefault(gram, []).append(idx - last.get(gram, 0))
+                last[gram] = idx
+
+        return {'n': n, 'paths': paths, 'grams': grams}
+
+    def ul_tag(self) -> str:
+        """Make the opening tag of the top-level list."""
+        tag = '<ul id="collapse"'
+        if self.compact and self.onmouseover:
+            tag += f' data-onmouseover="{escape(self.onmouseover)}"'
+        if self.compact and self.onclick:
+            tag += f' data-onclick="{escape(self.onclick)}"'
+        return tag + '>'
+
+    def iter_ul(self, tree: Union[DirNode, None] = None, indent: str = '  ', newl: str = '\n', size: int = 1000):
+        """Generate the directory trie as an indented html list in chunks.
+
+        The markup is made directly from the trie without building an xml document and matches the output of
+        minidom's toprettyxml for the element made by tree_to_xml.  With compact=True, each link only stores its path
+        in a data-path attribute (the onmouseover and onclick functions are listed once on the top-level list and
+        called by a delegated listener in collapse.js) and the indent and newl arguments are ignored.
+
+        Args:
+            tree: directory structure; defaults to self.tree
+            indent: indentation added at each level of the list
+            newl: line separator; any whitespace after the line break is applied to every following line
+            size: number of list items in each chunk
+
+        Yields:
+            html text
+        """
+        buf = []
+        write = buf.append
+        onclick = self.onclick
+        onmouseover = self.onmouseover
+
+        def flush():
+            chunk = ''.join(buf)
+            buf.clear()
+            return chunk
+
+        def write_compact(node):
+            for name in node.order:
+                if name is None:
+                    for ff in node.files:
+                        write(f'<li><A data-path="{escape(ff.html_path)}">{escape(ff.filename)}</A></li>\n')
+                        if len(buf) >= size:
+                            yield flush()
+                else:
+                    sub = node.children[name]
+                    folder_path = sub.path if sub.path is not None else self.folder_path(sub.dir)
+                    write(f'<li class="collapsed"><A data-path="{escape(folder_path)}">{escape(name)}</A><ul>\n')
+                    yield from write_compact(sub)
+                    write('</ul></li>\n')
+
+        def write_link(name, value, pad, dir=False):
+            write(f'{pad}<A')
+            if not dir:
+                write(' id="image_link"')
+            if onmouseover and not dir:
+                write(' onmouseover="' + escape(onmouseover + "('" + value + "')") + '"')
+            if onclick:
+                write(' onclick="' + escape(onclick + "('" + value + "')") + '"')
+                write(' href="' + escape(self.href(value)) + '"')
+            write(f'>{escape(name)}</A>{newl}' if name else f'/>{newl}')
+
+        def write_node(node, pad):
+            write(f'{pad}<ul id="collapse">{newl}')
+            inner = pad + indent
+            for name in node.order:
+                if name is None:
+                    for ff in node.files:
+                        write(f'{inner}<li>{newl}')
+                        write_link(ff.filename, ff.html_path, inner + indent)
+                        write(f'{inner}</li>{newl}')
+                        if len(buf) >= size:
+                            yield flush()
+                else:
+                    sub = node.children[name]
+                    write(f'{inner}<li class="collapsed">{newl}')
+                    folder_path = sub.path if sub.path is not None else self.folder_path(sub.dir)
+                    write_link(name, folder_path, inner + indent, dir=True)
+                    yield from write_node(sub, inner + indent)
+                    write(f'{inner}</li>{newl}')
+            write(f'{pad}</ul>{newl}')
+
+        tree = tree if tree is not None else self.tree
+        if self.compact:
+            write(self.ul_tag() + '\n')
+            yield from write_compact(tree)
+            write('</ul>\n')
+        else:
+            yield from write_node(tree, '')
+        if buf:
+            yield flush()
+
+    def write_ul(self, stream, tree: Union[DirNode, None] = None, indent: str = '  ', newl: str = '\n'):
+        """Write the directory trie to a text stream as an indented html list (see iter_ul).
+
+        Args:
+            stream: text stream with a write method (i.e., an open file or io.StringIO)
+            tree: directory structure; defaults to self.tree
+            indent: indentation added at each level of the list
+            newl: line separator; any whitespace after the line break is applied to every following line
+
+        Returns:
+            stream
+        """
+        for chunk in self.iter_ul(tree, indent, newl):
+            stream.write(chunk)
+
+        return stream
@@ -4,6 +4,81 @@
 /*   https://github.com/endangeredoxen/pywebify                                */
 /*******************************************************************************/
 
+var div_switch_companions = null;  // set of the files with a companion html file
+var div_switch_tokens = null;      // position of each file in pywebifyTokens
+var div_switch_preload = [];       // images being prefetched
+
+
+function div_switch_companion(name, ext) {
+    // Path of the companion html file of name or null if there is none
+    if (typeof pywebifyCompanions === 'undefined') {
+        // report without a companion list: always try the html file
+        return name.replace('.' + ext, '.html');
+    }
+    if (div_switch_companions === null) {
+        div_switch_companions = {};
+        for (var i = 0; i < pywebifyCompanions.length; i++) {
+            div_switch_companions[pywebifyCompanions[i]] = true;
+        }
+    }
+    if (div_switch_companions[name] !== true) {
+        return null;
+    }
+    return name.slice(0, name.length - ext.length) + 'html';
+}
+
+
+function div_switch_index(name) {
+    // Position of name in the sidebar order of pywebifyTokens or -1
+    if (typeof pywebifyTokens === 'undefined') {
+        return -1;
+    }
+    if (div_switch_tokens === null) {
+        div_switch_tokens = {};
+        for (var i = 0; i < pywebifyTokens.paths.length; i++) {
+            div_switch_tokens[pywebifyTokens.paths[i]] = i;
+        }
+    }
+    var index = div_switch_tokens[name];
+    return index === undefined ? -1 : index;
+}
+
+
+function div_switch_url(name) {
+    // Image url with the cache-busting token of the file so unchanged files load from the browser cache (reports
+    // without tokens reload the image every time)
+    var index = div_switch_index(name);
+    if (index < 0 || !pywebifyTokens.tokens[index]) {
+        return name + "?" + new Date().getTime();
+    }
+    return name + '?v=' + pywebifyTokens.tokens[index];
+}
+
+
+function div_switch_prefetch(name) {
+    // Load the images before and after name in the sidebar into the browser cache once the browser is idle
+    var index = div_switch_index(name);
+    if (index < 0) {
+        return;
+    }
+    var load = function() {
+        div_switch_preload = [];
+        for (var i = index - 1; i <= index + 1; i += 2) {
+            if (i >= 0 && i < pywebifyTokens.paths.length && pywebifyTokens.tokens[i]) {
+                var image = new Image();
+                image.src = div_switch_url(pywebifyTokens.paths[i]);
+                div_switch_preload.push(image);
+            }
+        }
+    };
+    if (window.requestIdleCallback) {
+        window.requestIdleCallback(load);
+    } else {
+        setTimeout(load, 0);
+    }
+}
+
+
 function div_switch(name) {
     // Check the file extension
     var re = /(?:\.([^.]+))?$/;
@@ -51,12 +126,12 @@ function div_switch(name) {
             // Image found, so replace with new
             image.removeAttribute('width');
             image.style.maxWidth = '100%';
-            image.src = name + "?" + new Date().getTime();
+            image.src = div_switch_url(name);
         } else {
             // Image not found, so create and add
             var image = document.createElement("img");
             var summary = document.getElementById('summary');
-            image.src = name + "?" + new Date().getTime();
+            image.src = div_switch_url(name);
             image.id = "img0";
             image.removeAttribute('width');
             image.style.maxWidth = '100%';
@@ -65,12 +140,15 @@ function div_switch(name) {
         }
 
         // Add any accompanying html
-        var newHTML = document.createElement("object");
-        newHTML.data = name.replace('.' + ext, '.html');
-        newHTML.id = "html0";
-        newHTML.width = '100%';
-        newHTML.height = '100%';
-        dv.insertBefore(newHTML, summary);
+        var companion = div_switch_companion(name, ext);
+        if (companion !== null) {
+            var newHTML = document.createElement("object");
+            newHTML.data = companion;
+            newHTML.id = "html0";
+            newHTML.width = '100%';
+            newHTML.height = '100%';
+            dv.insertBefore(newHTML, summary);
+        }
 
         var width0 = 0;
         var zoom = 'in';
@@ -124,4 +202,5 @@ function div_switch(name) {
     }
     viewer.scrollTop = 0;
     viewer.scrollLeft = 0;
+    div_switch_prefetch(name);
 }
\ No newline at end of file
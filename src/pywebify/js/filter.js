@@ -1,27 +1,175 @@
 /*******************************************************************************/
 /* Filters the report file list                                                */
 /*   Modified from http://jsfiddle.net/GoranMottram/4CJMe/4/                   */
+/*   Searches the n-gram index of the file paths written by PyWebify (in a     */
+/*   web worker if possible) and reveals only the matching branches            */
 /*   Designed for the PyWebify project                                         */
 /*   https://github.com/endangeredoxen/pywebify                                */
 /*******************************************************************************/
 (function ($) {
 
+    var delay = 150;      // debounce time in ms
+    var timer = null;
+    var worker = null;    // web worker running filter_search (false if unavailable)
+    var current = '';     // latest search term
+    var links = null;     // file <A> elements of the html sidebar in sidebar order
+    var marked = [];      // li elements revealed by the last search
+    var opened = [];      // folders expanded to reveal a match (collapsed again once the search is cleared)
+
+    function filter_search(index, term) {
+        // Numbers of the files whose lowercase path contains term
+        var paths = index.paths;
+        var ids = [];
+        var i;
+        if (term.length < index.n) {
+            for (i = 0; i < paths.length; i++) {
+                if (paths[i].indexOf(term) >= 0) {
+                    ids.push(i);
+                }
+            }
+            return ids;
+        }
+
+        // Decode the postings of each n-gram in the term (cached) and check the shortest list against the paths
+        if (index.decoded === undefined) {
+            index.decoded = {};
+        }
+        var shortest = null;
+        for (i = 0; i + index.n <= term.length; i++) {
+            var gram = term.substr(i, index.n);
+            var list = index.decoded[gram];
+            if (list === undefined) {
+                if (!Object.prototype.hasOwnProperty.call(index.grams, gram)) {
+                    return ids;
+                }
+                var deltas = index.grams[gram];
+                var id = 0;
+                list = new Int32Array(deltas.length);
+                for (var j = 0; j < deltas.length; j++) {
+                    id += deltas[j];
+                    list[j] = id;
+                }
+                index.decoded[gram] = list;
+            }
+            if (shortest === null || list.length < shortest.length) {
+                shortest = list;
+            }
+        }
+        for (i = 0; i < shortest.length; i++) {
+            if (paths[shortest[i]].indexOf(term) >= 0) {
+                ids.push(shortest[i]);
+            }
+        }
+        return ids;
+    }
+
+    function filter_worker() {
+        // Start a web worker from a blob so it also works for reports opened from disk
+        if (worker === null) {
+            try {
+                var code = 'var filter_search = ' + filter_search.toString() + ';\n' +
+                           'var index = null;\n' +
+                           'onmessage = function(event) {\n' +
+                           '    if (event.data.index) { index = event.data.index; return; }\n' +
+                           '    postMessage({term: event.data.term, ids: filter_search(index, event.data.term)});\n' +
+                           '};\n';
+                worker = new Worker(URL.createObjectURL(new Blob([code], {type: 'text/javascript'})));
+                worker.onmessage = function(event) {
+                    if (event.data.term == current) {
+                        filter_show(event.data.ids);
+                    }
+                };
+                worker.postMessage({index: pywebifySearch});
+            } catch (err) {
+                worker = false;
+            }
+        }
+        return worker;
+    }
+
+    function filter_item(id) {
+        // li of the id-th file in sidebar order
+        if (typeof pywebifySidebar !== "undefined") {
+            return sidebar_file(id);
+        }
+        if (links === null) {
+            links = document.querySelectorAll('#sidebar li:not(.collapsed) > a');
+        }
+        return links[id].parentNode;
+    }
+
+    function filter_clear() {
+        $(marked).removeClass('match');
+        marked = [];
+        $('#sidebar > ul').removeClass('filtered');
+    }
+
+    function filter_restore() {
+        // Show the whole list with the folders as they were before the search
+        filter_clear();
+        $(opened).removeClass('expanded');
+        opened = [];
+    }
+
+    function filter_show(ids) {
+        // Hide everything except the matching files and the folders above them
+        filter_clear();
+        var root = $('#sidebar > ul')[0];
+        $(root).addClass('filtered');
+        for (var i = 0; i < ids.length; i++) {
+            var li = filter_item(ids[i]);
+            while (li && !$(li).hasClass('match')) {
+                $(li).addClass('match');
+                marked.push(li);
+                var ul = li.parentNode;
+                if (ul === root) {
+                    break;
+                }
+                li = ul.parentNode;
+                if (!$(li).hasClass('expanded')) {
+                    $(li).addClass('expanded');
+                    opened.push(li);
+                }
+            }
+        }
+    }
+
+    function filter_dom(searchTerms, mylist) {
+        // Original search of the list text for reports without an index
+        $('#expandList').click();
+        $(mylist + ' li').each(function() {
+          var hasMatch = searchTerms.length == 0 || $(this).text().toLowerCase().indexOf(searchTerms.toLowerCase()) > 0;
+
+          $(this).toggle(hasMatch);
+        });
+    }
+
+    function filter(searchTerms, mylist) {
+        current = searchTerms.toLowerCase();
+        if (typeof pywebifySearch === "undefined") {
+            filter_dom(searchTerms, mylist);
+        } else if (current.length == 0) {
+            filter_restore();
+        } else if (filter_worker()) {
+            worker.postMessage({term: current});
+        } else {
+            filter_show(filter_search(pywebifySearch, current));
+        }
+    }
+
     function searchList(elm, mylist) { // elm is any element, mylist is an unordered list
         // create and add the filter form to the elm
         var form = $("<form>").attr({"class":"filterform","action":"#"}),
             input = $("<input>").attr({"class":"filterinput","type":"text","value":"Search..."});
         $(form).append(input).appendTo(elm);
         $(input).css({marginTop:$(elm).height()/2-$(input).outerHeight()/2}); //center the input field vertically
-        
+
         $(input).keyup(function(){
             var searchTerms = $(this).val();
-            $('#expandList').click();
-            console.log("Input change")
-            $(mylist + ' li').each(function() {
-              var hasMatch = searchTerms.length == 0 || $(this).text().toLowerCase().indexOf(searchTerms.toLowerCase()) > 0;
-
-              $(this).toggle(hasMatch);
-            });
+            clearTimeout(timer);
+            timer = setTimeout(function() {
+                filter(searchTerms, mylist);
+            }, delay);
         });
         $(input).focus(function() {
             $(input).val("");
@@ -32,4 +180,4 @@
     $(function () {
         searchList($("#navbar"), "#collapse");
     });
-}(jQuery));
\ No newline at end of file
+}(jQuery));
@@ -0,0 +1,198 @@
+############################################################################
+# manifest.py
+#   Persistent build manifest used to skip unchanged work on incremental
+#   report rebuilds
+############################################################################
+__author__ = 'Steve Nicholes'
+__copyright__ = 'Copyright (C) 2017 Steve Nicholes'
+__license__ = 'GPLv3'
+__url__ = 'https://github.com/endangeredoxen/pywebify'
+
+import os
+import json
+import hashlib
+from pathlib import Path
+from typing import Union
+from pywebify.html import scandir
+db = breakpoint
+
+MANIFEST_VERSION = 1
+
+
+def digest(*objs, ignore: Union[list, None] = None) -> str:
+    """Make a stable hash of one or more json-serializable objects.
+
+    Args:
+        objs: objects to hash (non-serializable values are converted with str)
+        ignore: substrings to remove from the serialized objects before hashing (i.e., timestamps)
+
+    Returns:
+        hex digest string
+    """
+    text = json.dumps(objs, sort_keys=True, default=str)
+    for ii in (ignore if ignore else []):
+        if ii:
+            text = text.replace(str(ii), '')
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+def stat(path: Union[str, Path]) -> Union[list, None]:
+    """Get the [mtime, size] signature of a file.
+
+    Args:
+        path: file path
+
+    Returns:
+        [mtime in ns, size in bytes] or None if the file does not exist
+    """
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return [st.st_mtime_ns, st.st_size]
+
+
+class BuildManifest():
+    def __init__(self, path: Union[str, Path], signature: str = ''):
+        """Record of the inputs and outputs of a report build.
+
+        The manifest stores the mtime and size of every input file along with the outputs it produced so that the
+        next build can skip the directory scan, rst conversion, file copies and template writes whose inputs did not
+        change.  A change in the build signature (i.e., config file contents or report options) invalidates the
+        entire manifest and forces a full rebuild.
+
+        Args:
+            path: location of the manifest json file (typically inside the report setup_subdir)
+            signature: hash of the build options; a mismatch with the saved signature discards the saved entries
+
+        """
+        self.path = Path(path)
+        self.signature = signature
+        self.old = self.load()
+        self.data = self.new()
+
+    def new(self) -> dict:
+        """Make an empty manifest dict."""
+        return {'version': MANIFEST_VERSION, 'signature': self.signature, 'dirs': {}, 'entries': {}, 'hashes': {}}
+
+    def load(self) -> dict:
+        """Read the manifest from the previous build if it is still valid."""
+        try:
+            with open(self.path, 'r') as input:
+                data = json.load(input)
+        except (OSError, ValueError):
+            return self.new()
+        if data.get('version') != MANIFEST_VERSION or data.get('signature') != self.signature:
+            return self.new()
+        return data
+
+    def content_hash(self, path: Union[str, Path], signature: list) -> Union[str, None]:
+        """Get the content hash of a file from the previous build if the file is unchanged.
+
+        Args:
+            path: file path
+            signature: current [mtime, size] of the file
+
+        Returns:
+            hash string or None if the file is new or has changed
+        """
+        entry = self.old.get('hashes', {}).get(str(path))
+        if entry is None or entry[:2] != list(signature):
+            return None
+        self.data['hashes'][str(path)] = entry
+        return entry[2]
+
+    def listdir(self, path: Union[str, Path]) -> [list, list, dict]:
+        """List the subdirectories and files of a directory, reusing the last listing if the directory is unchanged.
+
+        A directory mtime changes whenever an entry is added, removed or renamed so an unchanged mtime means the
+        listing from the previous build is still valid.
+
+        Args:
+            path: directory to list
+
+        Returns:
+            list of subdirectory names
+            list of file names
+            dict of {file name: os.DirEntry} for a fresh listing; empty if the listing was reused
+        """
+        key = str(path)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            return [], [], {}
+
+        entry = self.old['dirs'].get(key)
+        entries = {}
+        if entry is None or entry['mtime'] != mtime:
+            dirs, files, entries = scandir(path)
+            entry = {'mtime': mtime, 'dirs': dirs, 'files': files}
+
+        self.data['dirs'][key] = entry
+        return list(entry['dirs']), list(entry['files']), entries
+
+    def record(self, key: str, inputs: Union[list, None] = None, outputs: Union[list, None] = None,
+               digest: str = ''):
+        """Store the current state of a build step.
+
+        Args:
+            key: unique name of the build step
+            inputs: input file paths
+            outputs: output file paths
+            digest: optional hash of any non-file inputs
+        """
+        self.data['entries'][key] = {'inputs': {str(f): stat(f) for f in (inputs if inputs else [])},
+                                     'outputs': {str(f): stat(f) for f in (outputs if outputs else [])},
+                                     'digest': digest}
+
+    def record_hash(self, path: Union[str, Path], signature: list, value: str):
+        """Store the content hash of a file.
+
+        Args:
+            path: file path
+            signature: [mtime, size] of the file when it was hashed
+            value: hash string
+        """
+        self.data['hashes'][str(path)] = list(signature) + [value]
+
+    def save(self):
+        """Write the manifest to disk."""
+        if not self.path.parent.exists():
+            os.makedirs(self.path.parent)
+        with open(self.path, 'w') as output:
+            json.dump(self.data, output)
+
+    def unchanged(self, key: str, inputs: Union[list, None] = None, outputs: Union[list, None] = None,
+                  digest: str = '') -> bool:
+        """Check if a build step can be skipped.
+
+        A step is unchanged if it was recorded by the previous build with the same input files, the same digest,
+        and all of its outputs are still on disk untouched.  Unchanged steps are carried forward into the new
+        manifest.
+
+        Args:
+            key: unique name of the build step
+            inputs: input file paths
+            outputs: output file paths
+            digest: optional hash of any non-file inputs
+
+        Returns:
+            True if the step does not need to be redone
+        """
+        entry = self.old['entries'].get(key)
+        if entry is None or entry['digest'] != digest:
+            return False
+
+        inputs = [str(f) for f in (inputs if inputs else [])]
+        outputs = [str(f) for f in (outputs if outputs else [])]
+        if sorted(inputs) != sorted(entry['inputs'].keys()) or sorted(outputs) != sorted(entry['outputs'].keys()):
+            return False
+        for ff in inputs:
+            if entry['inputs'][ff] is None or stat(ff) != entry['inputs'][ff]:
+                return False
+        for ff in outputs:
+            if entry['outputs'][ff] is None or stat(ff) != entry['outputs'][ff]:
+                return False
+
+        self.data['entries'][key] = entry
+        return True
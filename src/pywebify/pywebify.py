@@ -8,22 +8,25 @@ __copyright__ = 'Copyright (C) 2015 Steve Nicholes'
 __license__ = 'GPLv3'
 __url__ = 'https://github.com/endangeredoxen/pywebify'
 
+from pywebify.assets import MODES, deploy_files, store_file
 from pywebify.config import ConfigFile
-from pywebify.html import Dir2HTML
-from pywebify.template import Template
+from pywebify.html import Dir2HTML, convert_rst_files
+from pywebify.manifest import BuildManifest, digest
+from pywebify.template import Chunks, Template
 from pathlib import Path
 from typing import Union
-import pdb
 import getpass
+import io
 import os
+import re
 import shutil
 import datetime
 import sys
-import subprocess
 CUR_DIR = Path(os.path.dirname(__file__))
 sys.path.append(CUR_DIR)
-db = pdb.set_trace
+db = breakpoint
 osjoin = os.path.join
+STORE_URL = '/pywebify-assets'  # url of an asset_store outside of base_path on the local http server
 
 
 def copy_configs(path: Path):
@@ -58,9 +61,16 @@ def fix_sep(path: Union[Path, None]) -> Path:
 
 
 def get_config():
-    """Read the default config path from the setup.txt file."""
+    """Read the default config path from the setup.txt file.
+
+    The setup.txt file is created on first use (not at import time).  If it cannot be written (i.e., a read-only
+    install), the default config.ini is used.
+    """
     if not (CUR_DIR / 'setup.txt').exists():
-        make_setup()
+        try:
+            make_setup()
+        except OSError:
+            return CUR_DIR / 'config.ini'
     with open(CUR_DIR / 'setup.txt', 'r') as input:
         return Path(input.readlines()[0])
 
@@ -99,6 +109,23 @@ def reset_config():
     set_config(Path(os.path.dirname(__file__)) / 'config.ini')
 
 
+def script_data(var: str, data: Union[dict, list]) -> str:
+    """Make a script that assigns json data to a global javascript variable.
+
+    The data is embedded as a JSON.parse string, which browsers parse faster than the equivalent object literal.
+
+    Args:
+        var: name of the javascript variable
+        data: json-serializable data
+
+    Returns:
+        script text
+    """
+    import json
+    text = json.dumps(json.dumps(data, separators=(',', ':')))
+    return f'var {var} = JSON.parse({text});\n'
+
+
 def set_config(path: Path):
     """Set the config path.
 
@@ -128,17 +155,64 @@ class PyWebify():
                 paths and filenames
 
         Keyword Args:
+            asset_check (str): how to tell if a setup file copied by an earlier build is up to date: "mtime"
+                (size and mtime) or "hash" (size and contents); defaults to "mtime"
+            asset_mode (str): how the javascript and image setup files are put in setup_subdir: "copy",
+                "hardlink", "symlink" or "reflink" (copy-on-write clone); unsupported modes fall back to a copy;
+                defaults to "copy"
+            asset_store (str): shared directory for the javascript and image setup files of many reports (i.e., the
+                root of a results share or a served static path); files are stored once under names with their
+                content hash and each report only writes its own css and json data to setup_subdir; defaults to
+                None (every report gets its own copies)
+            asset_store_url (str): url of asset_store as seen from the report (i.e., "/static/pywebify"); defaults
+                to the relative path from the report directory (or "/pywebify-assets" if serve and asset_store is
+                outside of base_path; the local http server serves asset_store at this url)
+            asset_workers (int): number of threads used to deploy the setup files; defaults to 4
+            cache_token (str): cache-busting token added to the image urls in the viewer so the browser can cache
+                them: "mtime" (hash of the file mtime and size), "hash" (hash of the file contents) or None to
+                reload every image on every view; defaults to "mtime"
             config (str): path to config ini file (note: most options are controlled using this file)
-            exclude (list): file names to exclude from the sidebar list of files
+            compact_sidebar (bool): store the path of each sidebar link once in a data attribute and handle the
+                links with one delegated listener instead of inline handlers (much smaller report html); defaults
+                to False
+            exclude (list): file names to exclude from the sidebar list of files (plain names match any part of
+                the path; use a "glob:" or "re:" prefix for wildcard or regex patterns); matching directories are
+                not scanned
+            incremental (bool): only redo the build steps whose inputs changed since the last build using a manifest
+                stored in setup_subdir
+            lazy_rst (bool): list rst files as html but only convert each one when compile_rst is called (used by
+                the on-demand ReportApp); defaults to False
+            lazy_sidebar (bool): write the file list to a separate json script in setup_subdir and build the sidebar
+                in the browser one folder at a time instead of inlining the full list in the report html; defaults to
+                False
             make (bool): make the report upon initialization of the class
+            max_depth (int): maximum number of subdirectory levels below base_path to scan; defaults to None
+                (unlimited)
             natsort (bool): use natural (human) sorting on the file list
             open (bool): pop open the report
             report_filename (str):  name of output html report file
             report_subdir (str): name of folder to dump report file
             rst (bool): flag to disable building rst files; defaults to True
+            rst_cache (bool): reuse previously compiled rst html when the rst source, rst css and docutils version are
+                unchanged; defaults to True
+            rst_cache_dir (str): location of the rst compile cache; defaults to a folder in setup_subdir
+            rst_cache_size (int): maximum number of files in the rst compile cache; defaults to 500
+            rst_jobs (int): number of processes used to convert rst files; defaults to 1
+            scan_workers (int): number of threads used to list directories concurrently; defaults to 1
+            serve (bool): view the report through a local http server (compression, ETags and byte ranges) instead of
+                opening the file directly; the build blocks until the server is stopped with Ctrl+C; defaults to
+                False
+            serve_connections (int): number of connections the http server handles at the same time (others
+                wait); defaults to 64
+            serve_host (str): interface for the http server; defaults to "127.0.0.1" (this machine only)
+            serve_port (int): port for the http server; defaults to 8000
+            serve_workers (int): number of threads the http server uses to read and compress files; defaults to 8
             setup_subdir (str): name of folder to dump report setup files
             show_ext (bool): show/hide file extension in the file list
             subtitle (str): report subtitle (location depends on template)
+            template_engine (str): engine for the report html template: "string" ($NAME placeholders in the
+                [TEMPLATES] html file) or "jinja" (Jinja2 template in the [TEMPLATES] jinja_html file, streamed to the
+                report with compiled bytecode cached in setup_subdir); defaults to "string"
             title (str): report title (location depends on template)
 
         """
@@ -169,12 +243,24 @@ class PyWebify():
         # Set class attributes
         if isinstance(base_path, str):
             base_path = Path(base_path)
+        self.asset_check = kwget(kwargs, self.config['OPTIONS'], 'asset_check', 'mtime')
+        self.asset_mode = kwget(kwargs, self.config['OPTIONS'], 'asset_mode', 'copy')
+        if self.asset_mode not in MODES:
+            print(f'unknown asset_mode "{self.asset_mode}"; using copy')
+            self.asset_mode = 'copy'
+        self.asset_store = kwget(kwargs, self.config['OPTIONS'], 'asset_store', None)
+        if self.asset_store:
+            self.asset_store = Path(self.asset_store).resolve()
+        self.asset_store_url = kwget(kwargs, self.config['OPTIONS'], 'asset_store_url', None)
+        self.asset_workers = kwget(kwargs, self.config['OPTIONS'], 'asset_workers', 4)
         self.base_path = base_path.resolve()
         self.build_rst = kwargs.get('build_rst', True)
         if self.build_rst and 'rst' not in self.config['FILES']['ext']:
             self.config['FILES']['ext'] += ['rst']
         elif not self.build_rst and 'rst' in self.config['FILES']['ext']:
             self.config['FILES']['ext'] = [f for f in self.config['FILES']['ext'] if f != 'rst']
+        self.cache_token = kwget(kwargs, self.config['OPTIONS'], 'cache_token', 'mtime')
+        self.compact_sidebar = kwget(kwargs, self.config['OPTIONS'], 'compact_sidebar', False)
         self.css = None
         self.css_path = ''
         self.css_replaces = self.get_replacements('css')
@@ -187,9 +273,14 @@ class PyWebify():
         self.html_dict = {}
         self.html_path = ''
         self.img_path = ''
+        self.incremental = kwget(kwargs, self.config['OPTIONS'], 'incremental', False)
         self.js_css = ''
         self.js_files = []
+        self.lazy_rst = kwargs.get('lazy_rst', False)
+        self.lazy_sidebar = kwget(kwargs, self.config['OPTIONS'], 'lazy_sidebar', False)
         self.make = kwget(kwargs, self.config['OPTIONS'], 'make', True)
+        self.manifest = None
+        self.max_depth = kwget(kwargs, self.config['OPTIONS'], 'max_depth', None)
         self.merge_html = kwargs.get('merge_html', True)
         self.natsort = kwget(kwargs, self.config['OPTIONS'], 'natsort', True)
         self.navbar_path = ''
@@ -206,10 +297,26 @@ class PyWebify():
             self.check_path('rst_css')
         else:
             self.rst_css = None
+        self.rst_cache = kwget(kwargs, self.config['OPTIONS'], 'rst_cache', True)
+        self.rst_cache_dir = kwget(kwargs, self.config['OPTIONS'], 'rst_cache_dir', None)
+        self.rst_cache_size = kwget(kwargs, self.config['OPTIONS'], 'rst_cache_size', 500)
+        self.rst_jobs = kwget(kwargs, self.config['OPTIONS'], 'rst_jobs', 1)
+        self.scan_workers = kwget(kwargs, self.config['FILES'], 'scan_workers', 1)
+        self.serve = kwget(kwargs, self.config['OPTIONS'], 'serve', False)
+        self.serve_connections = kwget(kwargs, self.config['OPTIONS'], 'serve_connections', 64)
+        self.serve_host = kwget(kwargs, self.config['OPTIONS'], 'serve_host', '127.0.0.1')
+        self.serve_port = kwget(kwargs, self.config['OPTIONS'], 'serve_port', 8000)
+        self.serve_workers = kwget(kwargs, self.config['OPTIONS'], 'serve_workers', 8)
+        if self.serve and self.asset_store and not self.asset_store_url and \
+                self.base_path not in [self.asset_store] + list(self.asset_store.parents):
+            # Relative urls cannot leave the served directory
+            self.asset_store_url = STORE_URL
         self.show_ext = kwargs.get('show_ext', self.config['OPTIONS']['show_ext'])
         self.special = {}
+        self.stored = {}
         self.subtitle = kwget(kwargs, self.config['OPTIONS'], 'subtitle', self.base_path.name)
         self.temp_path = ''
+        self.template_engine = kwget(kwargs, self.config['OPTIONS'], 'template_engine', 'string')
         self.title = kwget(kwargs, self.config['OPTIONS'], 'title', self.base_path.name)
         self.use_relative = kwget(kwargs, self.config['OPTIONS'], 'use_relative', True)
         for key, value in kwargs.items():
@@ -218,9 +325,17 @@ class PyWebify():
 
         # Set the output path
         self.set_output_paths()
+        if self.rst_cache and self.rst_cache_dir is None:
+            self.rst_cache_dir = self.setup_path / 'rst_cache'
+        elif not self.rst_cache:
+            self.rst_cache_dir = None
         self.exclude += [str(self.report_path / self.report_filename), str(self.setup_path), 'index.html']
         self.exclude = [f for f in self.exclude if f != '']  # this would remove everything from the sidebar
 
+        # Load the manifest of the previous build
+        if self.incremental:
+            self.set_manifest(kwargs)
+
         # Get the files at base_path
         self.get_files()
 
@@ -232,6 +347,39 @@ class PyWebify():
         if self.make:
             self.run()
 
+    def asset_url(self, path: str, css: bool = False) -> str:
+        """Get the url of a javascript or image setup file (i.e., "js/collapse.js") for the report.
+
+        With an asset_store, the file is added to the store (see pywebify.assets.store_file) and the url points at
+        the stored copy.  Otherwise the url points at the file in setup_subdir.
+
+        Args:
+            path: setup file path relative to setup_subdir
+            css: make the url relative to the report css file instead of the report html file
+
+        Returns:
+            url
+        """
+        if self.asset_store:
+            name = self.stored.get(path)
+            if name is None:
+                src = Path(self.config['FILES']['img_dir']) / path[4:] if path.startswith('img/') else Path(path)
+                src, st = self.find_setup_file(src)
+                if st is not None:
+                    name = store_file(src, self.asset_store, self.asset_mode, st)
+                    self.stored[path] = name
+            if name is not None:
+                if self.asset_store_url:
+                    return f'{self.asset_store_url.rstrip("/")}/{name}'
+                start = self.setup_path / 'css' if css else self.report_path
+                return Path(os.path.relpath(self.asset_store / name, start)).as_posix()
+
+        return f'../{path}' if css else f'{self.setup_subdir}/{path}'
+
+    def build_companions(self):
+        """Write the list of files with a companion html file for div_switch.js next to the report css."""
+        self.write_script_data('companions', 'pywebifyCompanions', self.files.companion_paths())
+
     def build_css(self):
         """Build the report css file."""
         # Get main css file
@@ -247,56 +395,44 @@ class PyWebify():
                 css_paths += [self.temp_path]
 
         # Write the css file
-        self.css = Template(css_paths, self.css_replaces + [self.special])
         dest = self.setup_path / 'css' / f'{self.report_filename}.css'
-        self.css.write(dest=dest, bonus=self.js_css)
+        key = f'css:{dest}'
+        store = [str(self.asset_store)] if self.asset_store else []
+        css_digest = digest(self.css_replaces, self.special, self.js_css, *store, ignore=[self.special['NOW']])
+        if self.manifest is not None and self.manifest.unchanged(key, css_paths, [dest], css_digest):
+            return
+        self.css = Template(css_paths, self.css_replaces + [self.special])
+        css = self.css.write(bonus=self.js_css)
+        if self.asset_store:
+            # Point the setup images at the asset store
+            css = re.sub(r'url\(\.\./(img/[^)\'"]+)\)', lambda m: f'url({self.asset_url(m.group(1), css=True)})', css)
 
         # Clean the css from any template parameters that weren't populated by the config file
-        with open(dest, 'r') as input:
-            css = input.readlines()
-        css_new = []
-        for line in css:
-            if '$' not in line:
-                css_new += [line]
+        css = ''.join(f for f in css.splitlines(True) if '$' not in f)
+        if not dest.parent.exists():
+            os.makedirs(dest.parent)
         with open(dest, 'w') as output:
-            output.write(''.join(css_new))
-
-        # Update css for compiled rsts with unique config sections titled as "RST_X", where X = some custom string
-        rst_config_keys = [f for f in self.config.keys() if f != 'RST' and 'RST' in f]
-        custom = []
-        for kk in rst_config_keys:
-            if self.config[kk].get('replace_in'):
-                replace = self.config[kk].get('replace_in')
-                if not isinstance(replace, list):
-                    replace = [replace]
-                for rr in replace:
-                    rr = str(Path(rr))
-                    found = [f for f in self.files.rst_files if rr in f]
-                    for ff in found:
-                        custom += [ff]
-                        ff2 = ff.replace('.rst', '.html')
-                        temp_css = Template(ff2, [self.config[kk]])  # replace defaults?
-                        temp_css.write(dest=ff2)
-
-        # Update css for compiled rsts without custom config parameters
-        defaults = [f for f in self.files.rst_files if f not in custom]
-        if 'RST' in self.config.keys():
-            for dd in defaults:
-                dd2 = dd.replace('.rst', '.html')
-                temp_css = Template(dd2, [self.config['RST']])
-                temp_css.write(dest=dd2)
+            output.write(css)
+        if self.manifest is not None:
+            self.manifest.record(key, css_paths, [dest], css_digest)
 
     def build_html(self):
         """Build the html report file."""
-        # Populate the html replacement dictionary
-        self.html_dict['SIDEBAR'] = self.files.ul.replace('  ', '    ').replace('\n', '\n            ')
-        self.html_dict['JS_FILES'], self.js_files, self.js_css = self.get_javascript(self.config['JAVASCRIPT']['files'])
-
-        # Load the html template and build
-        self.html_path = Path(self.config['TEMPLATES']['html'])
-        self.check_path('html_path')
-        self.html = Template(self.html_path, [self.html_dict, self.special])
-        self.html.write(dest=self.report_path / f'{self.report_filename}.html')
+        self.get_html()
+        dest = self.report_path / f'{self.report_filename}.html'
+        key = f'html:{dest}'
+        if self.manifest is not None:
+            # The sidebar is hashed by its inputs so a streamed sidebar is not rendered just for the digest
+            subs = {k: v for k, v in self.html_dict.items() if k != 'SIDEBAR'}
+            sidebar = [self.files.tree_to_json(), self.files.compact, self.files.onclick, self.files.onmouseover,
+                       self.files.show_ext, self.files.use_relative, self.lazy_sidebar, self.template_engine]
+            html_digest = digest(subs, sidebar, self.special, ignore=[self.special['NOW']])
+            if self.manifest.unchanged(key, [self.html_path], [dest], html_digest):
+                return
+        self.html = self.get_html_template()
+        self.html.write(dest=dest)
+        if self.manifest is not None:
+            self.manifest.record(key, [self.html_path], [dest], html_digest)
 
     def build_navbar(self):
         """Build the top level navbar menu for the report."""
@@ -309,6 +445,44 @@ class PyWebify():
                 self.navbar = Template(self.navbar_path, nav_replaces+[self.special])
                 self.html_dict['NAVBAR'] = self.navbar.write()
 
+    def build_scripts(self):
+        """Build the json data files used by the report javascript."""
+        if 'div_switch.js' in self.config['JAVASCRIPT']['files']:
+            self.build_companions()
+            if self.cache_token:
+                self.build_tokens()
+        if self.lazy_sidebar:
+            self.build_sidebar()
+        if 'filter.js' in self.config['JAVASCRIPT']['files']:
+            self.build_search()
+
+    def build_search(self):
+        """Write the n-gram search index of the file paths used by filter.js next to the report css."""
+        self.write_script_data('search', 'pywebifySearch', self.files.search_index())
+
+    def build_setup(self):
+        """Build the css file and copy the javascript and image files to the setup_subdir."""
+        self.build_css()
+        if self.asset_store:
+            # The javascript and images are added to the shared store as they are referenced
+            return
+        self.move_files(self.js_files)
+
+        self.img_path = self.config['FILES']['img_dir']
+        self.check_path('img_path')
+        self.move_files([Path(self.img_path) / f for f in os.listdir(self.img_path)], new_dir='img')
+
+    def build_sidebar(self):
+        """Write the file tree for the lazy-loaded sidebar next to the report css."""
+        tree = {'compact': self.compact_sidebar, 'onclick': self.files.onclick, 'onmouseover': self.files.onmouseover,
+                'tree': self.files.tree_to_json()}
+        self.write_script_data('sidebar', 'pywebifySidebar', tree)
+
+    def build_tokens(self):
+        """Write the cache-busting token of each report file for div_switch.js next to the report css."""
+        tokens = self.files.file_tokens(content=self.cache_token == 'hash')
+        self.write_script_data('tokens', 'pywebifyTokens', tokens)
+
     def check_path(self, path: str):
         """Handle relative paths for files in current directory.
 
@@ -323,18 +497,107 @@ class PyWebify():
             # else:
             #    raise FileNotFoundError(f'could not find a file named {path}')
 
+    def compile_rst(self, rst: str) -> bool:
+        """Convert a single rst file from the report list and apply its css replacements.
+
+        Args:
+            rst: rst file path
+
+        Returns:
+            True if the html file was built
+        """
+        subs = self.get_rst_subs([rst])
+        errors = convert_rst_files([rst], stylesheet=self.files.rst_css, cache_dir=self.rst_cache_dir,
+                                   cache_size=self.rst_cache_size, subs=subs)
+        if rst in errors:
+            print(f'failed to convert rst file "{rst}": {errors[rst]}')
+            return False
+        if self.manifest is not None:
+            self.manifest.record(*self.files.rst_manifest_entry(rst, subs))
+
+        return True
+
+    def find_setup_file(self, path: Path) -> [Path, Union[os.stat_result, None]]:
+        """Find a setup file in the current directory or the pywebify package directory (same as check_path).
+
+        Args:
+            path: file path
+
+        Returns:
+            file path
+            os.stat result or None if the file does not exist
+        """
+        for src in [fix_sep(path), CUR_DIR / fix_sep(path)]:
+            try:
+                return src, os.stat(src)
+            except OSError:
+                pass
+
+        return path, None
+
     def get_files(self):
         """Build a Dir2HTML file object.
 
         This object contains the list of files in the directory and a ul/li html list implementation of the directory
         structure.  The constructor for this object also provides inputs to compile rst files into html.  The css
-        for these compiled rst files if applied in Pywebify.build_css in order to allow custom css per rst page.
+        replacement strings of each rst page (see get_rst_subs) are applied as its html is written in order to allow
+        custom css per rst page.
         """
         self.files = Dir2HTML(str(self.base_path), self.config['FILES']['ext'],
                               onmouseover=self.config['SIDEBAR']['onmouseover'], from_file=self.from_file,
                               onclick=self.config['SIDEBAR']['onclick'], exclude=self.exclude,
                               merge_html=self.merge_html, use_relative=self.use_relative, show_ext=self.show_ext,
-                              build_rst=self.build_rst, rst_css=self.rst_css, natsort=self.natsort)
+                              build_rst=self.build_rst, compact=self.compact_sidebar, rst_css=self.rst_css,
+                              natsort=self.natsort, manifest=self.manifest, max_depth=self.max_depth,
+                              scan_workers=self.scan_workers, rst_jobs=self.rst_jobs, rst_cache_dir=self.rst_cache_dir,
+                              rst_cache_size=self.rst_cache_size, lazy_rst=self.lazy_rst,
+                              rst_subs=self.get_rst_subs)
+
+    def get_html(self):
+        """Populate the html replacement dictionary and find the html template."""
+        js_files = self.config['JAVASCRIPT']['files']
+        if not isinstance(js_files, list):
+            js_files = [js_files]
+        if self.lazy_sidebar:
+            # Only an empty list goes in the html; sidebar.js builds it from the json tree
+            self.html_dict['SIDEBAR'] = self.files.ul_tag() + '</ul>'
+            if self.template_engine == 'jinja':
+                self.html_dict['SIDEBAR'] = Chunks(iter, [self.html_dict['SIDEBAR']])
+            js_files = js_files + [f for f in ['collapse.js', 'sidebar.js'] if f not in js_files]
+        elif self.template_engine == 'jinja':
+            # Streamed in chunks while the template is rendered
+            self.html_dict['SIDEBAR'] = Chunks(self.files.iter_ul, indent='    ', newl='\n' + ' ' * 12)
+        else:
+            self.html_dict['SIDEBAR'] = \
+                self.files.write_ul(io.StringIO(), indent='    ', newl='\n' + ' ' * 12).getvalue()
+        self.html_dict['JS_FILES'], self.js_files, self.js_css = self.get_javascript(js_files)
+
+        # Add the json data scripts; the search index is not needed until the first search so it loads async
+        data = []
+        if 'div_switch.js' in js_files:
+            data += [('companions', '')]
+            if self.cache_token:
+                data += [('tokens', '')]
+        if self.lazy_sidebar:
+            data += [('sidebar', '')]
+        if 'filter.js' in js_files:
+            data += [('search', ' async')]
+        for name, attr in reversed(data):
+            self.html_dict['JS_FILES'] = f'<script type="text/javascript" src="{self.setup_subdir}/css/' \
+                                         f'{self.report_filename}_{name}.js"{attr}></script>\n    ' + \
+                                         self.html_dict['JS_FILES']
+
+        # Find the html template
+        if self.template_engine == 'jinja':
+            self.html_path = Path(self.config['TEMPLATES'].get('jinja_html', r'templates\jinja\webify.html'))
+        else:
+            self.html_path = Path(self.config['TEMPLATES']['html'])
+        self.check_path('html_path')
+
+    def get_html_template(self) -> Template:
+        """Make the Template of the report html page with the selected template engine."""
+        return Template(self.html_path, [self.html_dict, self.special], engine=self.template_engine,
+                        bytecode_cache=self.setup_path / 'jinja_cache')
 
     def get_javascript(self, files: list) -> [str, list, str]:
         """Adds javascript files to the report.
@@ -353,7 +616,7 @@ class PyWebify():
 
         for f in files:
             # Define the script call for the html file
-            js += [f'<script type="text/javascript" src="{self.setup_subdir}/js/{f}"></script>\n']
+            js += [f'<script type="text/javascript" src="{self.asset_url(f"js/{f}")}"></script>\n']
 
             # Add the filename to the js file list
             jsfiles += [Path('js') / f]
@@ -381,6 +644,38 @@ class PyWebify():
                 replaces += [self.config[sec]]
         return replaces
 
+    def get_rst_subs(self, rst_files: list) -> dict:
+        """Find the css replacement strings for compiled rst files.
+
+        Rst files matching the "replace_in" paths of config sections titled "RST_X" (X = some custom string) use
+        those sections; all other rst files use the RST section.
+
+        Args:
+            rst_files: rst file paths
+
+        Returns:
+            dict of {rst path: list of replacement dicts to apply in order}
+        """
+        subs = {}
+        rst_config_keys = [f for f in self.config.keys() if f != 'RST' and 'RST' in f]
+        for kk in rst_config_keys:
+            if self.config[kk].get('replace_in'):
+                replace = self.config[kk].get('replace_in')
+                if not isinstance(replace, list):
+                    replace = [replace]
+                for rr in replace:
+                    rr = str(Path(rr))
+                    for ff in [f for f in rst_files if rr in f]:
+                        subs.setdefault(ff, []).append(self.config[kk])  # replace defaults?
+
+        # Defaults for compiled rsts without custom config parameters
+        if 'RST' in self.config.keys():
+            for ff in rst_files:
+                if ff not in subs:
+                    subs[ff] = [self.config['RST']]
+
+        return subs
+
     def get_special(self):
         """Populate "special" replacement strings."""
         self.special['BASEPATH'] = '.'
@@ -391,17 +686,27 @@ class PyWebify():
             self.special['JQUERY'] = self.config['JAVASCRIPT']['jquery']
         else:
             # or use local version
-            self.special['JQUERY'] = self.setup_subdir / 'js' / 'jquery.min.js'
+            self.special['JQUERY'] = self.setup_subdir / 'js' / 'jquery.min.js' if not self.asset_store else \
+                self.asset_url('js/jquery.min.js')
         self.special['NOW'] = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         self.special['COMPILEDBY'] = getpass.getuser()
         self.special['FAVICON'] = fix_sep(self.config['ICONS']['favicon'])
+        depth = len(self.setup_subdir.parts)
+        if self.asset_store and self.special['FAVICON'] and \
+                self.special['FAVICON'].parts[:depth] == self.setup_subdir.parts:
+            self.special['FAVICON'] = self.asset_url(Path(*self.special['FAVICON'].parts[depth:]).as_posix())
         logo = fix_sep(self.config['ICONS']['logo'])
-        if logo is not None:
+        logo_url = None
+        if logo is not None and self.asset_store:
+            # Stored once like the favicon instead of copied to the setup_subdir of every report
+            parts = logo.parts[depth:] if logo.parts[:depth] == self.setup_subdir.parts else logo.parts
+            logo_url = self.asset_url(Path(*parts).as_posix())
+        elif logo is not None:
             self.move_files([logo], new_dir='img')
         self.special['QUANTITY'] = '%s' % len(self.files.files)
         self.special['REPORTNAME'] = self.report_filename
         if self.config['OPTIONS']['start_screen'] == 'logo' and logo:
-            self.special['START_SCREEN'] = f'<img id="img0" src="{logo.parent}" alt="" />'
+            self.special['START_SCREEN'] = f'<img id="img0" src="{logo_url if logo_url else logo.parent}" alt="" />'
         elif 'html' in self.config['OPTIONS']['start_screen']:
             self.special['START_SCREEN'] = \
                 '<object id="html0" data="' + self.config['OPTIONS']['start_screen'] + '" width=100% height=100% />'
@@ -415,55 +720,84 @@ class PyWebify():
         if sys.platform == "win32":
             os.startfile(filename)
         else:
+            import subprocess
             opener = "open" if sys.platform == "darwin" else "xdg-open"
             subprocess.call([opener, str(filename)])
 
+    def launch_server(self):
+        """Serve the report directory with a local http server until interrupted (opens the report if self.open)."""
+        from pywebify.server import serve
+        report = (self.report_path / f'{self.report_filename}.html').relative_to(self.base_path)
+        serve(self.base_path, self.serve_host, int(self.serve_port), report if self.open else None,
+              index=f'{self.report_filename}.html', workers=int(self.serve_workers),
+              max_connections=int(self.serve_connections), asset_store=self.asset_store,
+              asset_store_url=self.asset_store_url)
+
     def move_files(self, files: list, new_dir: Union[None, bool, Path] = None):
         """Transfer files to the report directory.
 
+        Files are deployed with asset_mode and skipped if the copy from an earlier build is still up to date (see
+        pywebify.assets.deploy_file).  Relative paths that do not exist in the current directory are looked up in
+        the pywebify package directory (same as check_path) with a single stat per file.
+
         Args:
             files: filepaths to transfer
             new_dir:  make a new directory flag or a Path
 
         """
+        todo = []
         for f in files:
             f = Path(f)
-            self.temp_path = Path(f)
-            self.check_path('temp_path')
-            if self.temp_path.exists():
-                if new_dir is not None:
-                    path = self.setup_path / new_dir
-                else:
-                    path = self.setup_path / f.parent
-                if not path.exists():
-                    os.makedirs(path)
-                try:
-                    shutil.copy(self.temp_path, path / f.name)
-                except shutil.SameFileError:
-                    pass
+            src, st = self.find_setup_file(f)
+            if st is None:
+                continue
+            if new_dir is not None:
+                path = self.setup_path / new_dir
+            else:
+                path = self.setup_path / f.parent
+            todo += [(src, path / f.name, st)]
+
+        deploy_files(todo, mode=self.asset_mode, check=self.asset_check, workers=self.asset_workers)
 
     def run(self):
         """Build, move, and open the report files."""
         # Build the navbar
         self.build_navbar()
 
+        # Build the javascript data files
+        self.build_scripts()
+
         # Build the html file
         self.build_html()
 
-        # Build the css file
-        self.build_css()
-
-        # Move any static files
-        self.move_files(self.js_files)
+        # Build the css file and move any static files
+        self.build_setup()
 
-        self.img_path = self.config['FILES']['img_dir']
-        self.check_path('img_path')
-        self.move_files([osjoin('img', f) for f in os.listdir(self.img_path)])
+        # Save the build manifest for the next incremental build
+        if self.manifest is not None:
+            self.manifest.save()
 
         # Open web report
-        if self.open:
+        if self.serve:
+            self.launch_server()
+        elif self.open:
             self.launch()
 
+    def set_manifest(self, kwargs: dict):
+        """Load the build manifest from the previous incremental build.
+
+        The manifest signature covers the config file contents, the user kwargs and the pywebify version so that any
+        change to the report options forces a full rebuild.
+
+        Args:
+            kwargs: user keyword arguments
+        """
+        with open(CUR_DIR / 'version.txt', 'r') as input:
+            version = input.read()
+        options = {k: v for k, v in kwargs.items() if k not in ['make', 'open']}
+        signature = digest(self.config, options, str(self.base_path), version)
+        self.manifest = BuildManifest(self.setup_path / 'manifest.json', signature)
+
     def set_output_paths(self):
         """Update the report path for the actual html file and all supplementary files."""
         # Update the base path if reading from file
@@ -482,6 +816,29 @@ class PyWebify():
         else:
             self.setup_path = self.base_path
 
+    def write_script_data(self, name: str, var: str, data: Union[dict, list]):
+        """Write json data for the report javascript to a script file in the setup_subdir css folder.
+
+        The data is wrapped in a short script that assigns it to a global variable so the report can load it with a
+        <script> tag when opened directly from disk (browsers block fetching local json files).  The file is only
+        rewritten if the data changed so browsers can keep it cached.
+
+        Args:
+            name: suffix of the file name (i.e., "sidebar" for report_sidebar.js)
+            var: name of the javascript variable
+            data: json-serializable data
+        """
+        text = script_data(var, data)
+        dest = self.setup_path / 'css' / f'{self.report_filename}_{name}.js'
+        if dest.exists():
+            with open(dest, 'r') as input:
+                if input.read() == text:
+                    return
+        if not dest.parent.exists():
+            os.makedirs(dest.parent)
+        with open(dest, 'w') as output:
+            output.write(text)
+
     def update_rst_css(self):
         """Convert rst files into built html."""
         pass
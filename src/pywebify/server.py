@@ -0,0 +1,516 @@
+############################################################################
+# server.py
+#   Local asyncio http server for viewing reports in a browser with
+#   compression, ETag revalidation and byte-range requests
+############################################################################
+__author__ = 'Steve Nicholes'
+__copyright__ = 'Copyright (C) 2017 Steve Nicholes'
+__license__ = 'GPLv3'
+__url__ = 'https://github.com/endangeredoxen/pywebify'
+
+import os
+import asyncio
+import email.utils
+import gzip
+import hashlib
+import mimetypes
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Union
+from urllib.parse import parse_qs, unquote, urlsplit
+from pywebify.assets import STORED
+db = breakpoint
+
+CHUNK = 256 * 1024
+COMPRESSIBLE = ['application/javascript', 'application/json', 'application/xml', 'image/svg+xml']
+STATUS = {200: 'OK', 206: 'Partial Content', 301: 'Moved Permanently', 304: 'Not Modified', 400: 'Bad Request',
+          404: 'Not Found', 405: 'Method Not Allowed', 416: 'Range Not Satisfiable'}
+
+
+def accept_encoding(header: str) -> list:
+    """Parse an Accept-Encoding header.
+
+    Args:
+        header: header value (i.e., "gzip, deflate, br;q=0.8")
+
+    Returns:
+        list of the accepted encodings (q > 0)
+    """
+    accepted = []
+    for item in header.split(','):
+        name, _, params = item.strip().partition(';')
+        qvalue = 1.0
+        for param in params.split(';'):
+            key, _, value = param.strip().partition('=')
+            if key == 'q':
+                try:
+                    qvalue = float(value)
+                except ValueError:
+                    qvalue = 0
+        if name and qvalue > 0:
+            accepted += [name.strip().lower()]
+
+    return accepted
+
+
+def byte_range(header: str, size: int) -> Union[tuple, None, bool]:
+    """Parse a single-range Range header.
+
+    Args:
+        header: header value (i.e., "bytes=0-499", "bytes=500-" or "bytes=-500")
+        size: file size in bytes
+
+    Returns:
+        (first byte, last byte) tuple, None if the header is not a valid single byte range (the whole file is sent)
+        or False if the range cannot be satisfied
+    """
+    unit, _, spec = header.partition('=')
+    if unit.strip().lower() != 'bytes' or ',' in spec:
+        return None
+    first, sep, last = spec.strip().partition('-')
+    if not sep:
+        return None
+    try:
+        if first == '':
+            # suffix range: the last N bytes
+            length = int(last)
+            if length <= 0:
+                return False
+            return max(size - length, 0), size - 1
+        first = int(first)
+        last = int(last) if last != '' else size - 1
+    except ValueError:
+        return None
+    if first >= size:
+        return False
+    if first > last:
+        return None
+
+    return first, min(last, size - 1)
+
+
+def brotli_module():
+    """Import the optional brotli package.
+
+    Returns:
+        brotli module or None if it is not installed
+    """
+    try:
+        import brotli
+    except ImportError:
+        return None
+    return brotli
+
+
+def etag_match(header: str, etag: str) -> bool:
+    """Check an If-None-Match header against the ETag of a file.
+
+    The comparison is weak (RFC 7232) so the ETags of the compressed versions of the file also match.
+
+    Args:
+        header: header value
+        etag: ETag of the file (without an encoding suffix)
+
+    Returns:
+        True if the browser copy is current
+    """
+    for tag in header.split(','):
+        tag = tag.strip()
+        if tag == '*':
+            return True
+        if tag.startswith('W/'):
+            tag = tag[2:]
+        if tag == etag or (tag.startswith(etag[:-1] + '-') and tag.endswith('"')):
+            return True
+
+    return False
+
+
+class ReportServer():
+    def __init__(self, root: Union[str, Path], host: str = '127.0.0.1', port: int = 8000,
+                 index: str = 'index.html', **kwargs):
+        """Asyncio http server for the files of a report.
+
+        Only GET and HEAD requests for files inside root are answered.  Every file has a strong ETag made from a
+        hash of its contents (cached until the file mtime or size changes) so browsers can revalidate with
+        If-None-Match and get a 304 instead of the file.  Text files are compressed with brotli (if installed) or
+        gzip depending on the Accept-Encoding header and the compressed bodies are kept in a bounded cache.  Large
+        files are streamed in chunks and single byte ranges are supported.  Files requested with a "v" cache-busting
+        token in the query string (see Dir2HTML.file_tokens) and the content-addressed files of asset_store (see
+        pywebify.assets.store_file) are marked as immutable.  Request bodies are not read so a connection is closed
+        after a request that has one.
+
+        Args:
+            root: directory to serve
+            host: interface to bind; the default only accepts connections from this machine
+            port: port to bind (0 picks a free port)
+            index: file served for a directory url
+
+        Keyword Args:
+            cache_size (int): maximum size of the compressed file cache in bytes; defaults to 32 MB
+            compress_max (int): largest file size to compress in bytes; defaults to 8 MB
+            compress_min (int): smallest file size to compress in bytes; defaults to 1024
+            max_connections (int): number of connections handled at the same time (others wait); defaults to 64
+            timeout (float): seconds to wait for the next request on an idle keep-alive connection; defaults to 15
+            asset_store (str): shared asset store directory of the reports (see pywebify.assets.store_file)
+            asset_store_url (str): url path that serves asset_store (i.e., "/pywebify-assets") when it is outside of
+                root; defaults to None
+            workers (int): number of threads used to read, hash and compress files; defaults to 8
+
+        """
+        self.root = os.path.realpath(str(root))
+        self.host = host
+        self.port = port
+        self.index = index
+        self.asset_store = os.path.realpath(str(kwargs['asset_store'])) if kwargs.get('asset_store') else None
+        url = urlsplit(kwargs.get('asset_store_url', None) or '')
+        self.asset_store_url = url.path.rstrip('/') if self.asset_store and not url.netloc else ''
+        self.cache_size = kwargs.get('cache_size', 32 * 1024 * 1024)
+        self.compress_max = kwargs.get('compress_max', 8 * 1024 * 1024)
+        self.compress_min = kwargs.get('compress_min', 1024)
+        self.max_connections = kwargs.get('max_connections', 64)
+        self.timeout = kwargs.get('timeout', 15)
+        self.workers = kwargs.get('workers', 8)
+
+        self.brotli = brotli_module()
+        self.compressed = OrderedDict()  # {(path, signature, encoding): body}
+        self.compressed_size = 0
+        self.etags = OrderedDict()  # {path: (signature, etag)}
+        self.executor = None
+        self.limit = None
+        self.lock = threading.Lock()  # guards the caches shared by the worker threads
+        self.server = None
+
+    @property
+    def url(self) -> str:
+        """Base url of the running server."""
+        return f'http://{self.host}:{self.port}/'
+
+    def close(self):
+        """Stop accepting connections and shut down the worker threads."""
+        if self.server is not None:
+            self.server.close()
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
+
+    def compress(self, path: str, signature: tuple, encoding: str) -> bytes:
+        """Compress a file (run in a worker thread).
+
+        Args:
+            path: file path
+            signature: (mtime, size) of the file
+            encoding: "br" or "gzip"
+
+        Returns:
+            compressed file contents
+        """
+        key = (path, signature, encoding)
+        with self.lock:
+            body = self.compressed.get(key)
+            if body is not None:
+                self.compressed.move_to_end(key)
+                return body
+
+        with open(path, 'rb') as input:
+            data = input.read()
+        if encoding == 'br':
+            body = self.brotli.compress(data)
+        else:
+            body = gzip.compress(data, compresslevel=6)
+
+        # Keep the most recent bodies up to cache_size bytes
+        with self.lock:
+            if key not in self.compressed:
+                self.compressed[key] = body
+                self.compressed_size += len(body)
+            while self.compressed_size > self.cache_size and len(self.compressed) > 0:
+                self.compressed_size -= len(self.compressed.popitem(last=False)[1])
+
+        return body
+
+    def encoding(self, headers: dict, content_type: str, size: int) -> str:
+        """Choose the content encoding of a response.
+
+        Args:
+            headers: request headers
+            content_type: mime type of the file
+            size: file size in bytes
+
+        Returns:
+            "br", "gzip" or "" (no compression)
+        """
+        if not self.is_compressible(content_type) or not self.compress_min <= size <= self.compress_max:
+            return ''
+        accepted = accept_encoding(headers.get('accept-encoding', ''))
+        if self.brotli is not None and 'br' in accepted:
+            return 'br'
+        if 'gzip' in accepted:
+            return 'gzip'
+
+        return ''
+
+    def etag(self, path: str, signature: tuple) -> str:
+        """Get the strong ETag of a file (run in a worker thread).
+
+        Args:
+            path: file path
+            signature: (mtime, size) of the file
+
+        Returns:
+            quoted ETag string
+        """
+        with self.lock:
+            cached = self.etags.get(path)
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+
+        sha = hashlib.sha1()
+        with open(path, 'rb') as input:
+            for chunk in iter(lambda: input.read(1 << 20), b''):
+                sha.update(chunk)
+        etag = f'"{sha.hexdigest()[:16]}"'
+        with self.lock:
+            self.etags[path] = (signature, etag)
+            if len(self.etags) > 4096:
+                self.etags.popitem(last=False)
+
+        return etag
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Answer the requests of one (possibly keep-alive) connection."""
+        async with self.limit:
+            try:
+                keep_alive = True
+                while keep_alive:
+                    line = await asyncio.wait_for(reader.readline(), self.timeout)
+                    if not line.strip():
+                        break
+                    parts = line.decode('latin-1').split()
+                    headers = {}
+                    while True:
+                        header = await asyncio.wait_for(reader.readline(), self.timeout)
+                        if header in (b'\r\n', b'\n', b''):
+                            break
+                        key, _, value = header.decode('latin-1').partition(':')
+                        headers[key.strip().lower()] = value.strip()
+                    if len(parts) != 3:
+                        await self.send(writer, 400, {}, b'', 'GET')
+                        break
+
+                    method, target, version = parts
+                    connection = headers.get('connection', '').lower()
+                    keep_alive = connection != 'close' if version == 'HTTP/1.1' else connection == 'keep-alive'
+                    if headers.get('content-length', '0') != '0' or 'transfer-encoding' in headers:
+                        # The unread body would be taken for the next request
+                        keep_alive = False
+                    await self.respond(writer, method, target, headers, keep_alive)
+            except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError, ValueError):
+                pass
+            finally:
+                writer.close()
+
+    def is_compressible(self, content_type: str) -> bool:
+        """Check if a mime type is worth compressing."""
+        return content_type.startswith('text/') or content_type in COMPRESSIBLE
+
+    def is_stored(self, path: str) -> bool:
+        """Check if a file is a content-addressed file of the asset store."""
+        return self.asset_store is not None and path.startswith(self.asset_store + os.sep) and \
+            STORED.search(path) is not None
+
+    def resolve(self, target: str) -> Union[str, None]:
+        """Map a request target to a file inside root (or inside asset_store for targets under asset_store_url).
+
+        Args:
+            target: request target (i.e., "/report.html?id=plot")
+
+        Returns:
+            file path or None if the target is outside root or does not exist
+        """
+        path = unquote(urlsplit(target).path)
+        root = self.root
+        if self.asset_store_url.startswith('/') and (path + '/').startswith(self.asset_store_url + '/'):
+            path = path[len(self.asset_store_url):]
+            root = self.asset_store
+        parts = [f for f in path.split('/') if f not in ['', '.']]
+        if any(f == '..' or '\\' in f or '\0' in f for f in parts):
+            return None
+        path = os.path.realpath(os.path.join(root, *parts))
+        if path != root and not path.startswith(root + os.sep):
+            return None
+        if os.path.isdir(path):
+            path = os.path.join(path, self.index)
+        if not os.path.isfile(path):
+            return None
+
+        return path
+
+    async def respond(self, writer: asyncio.StreamWriter, method: str, target: str, headers: dict,
+                      keep_alive: bool):
+        """Send the response to a single request.
+
+        Args:
+            writer: connection stream
+            method: http method
+            target: request target
+            headers: request headers (lowercase names)
+            keep_alive: leave the connection open after the response
+        """
+        loop = asyncio.get_event_loop()
+        base = {'Connection': 'keep-alive' if keep_alive else 'close'}
+        if method not in ['GET', 'HEAD']:
+            base['Allow'] = 'GET, HEAD'
+            await self.send(writer, 405, base, b'', method)
+            return
+        path = self.resolve(target)
+        if path is None:
+            await self.send(writer, 404, base, b'Not Found', method)
+            return
+
+        try:
+            st = os.stat(path)
+            signature = (st.st_mtime_ns, st.st_size)
+            etag = await loop.run_in_executor(self.executor, self.etag, path, signature)
+        except OSError:
+            await self.send(writer, 404, base, b'Not Found', method)
+            return
+        size = st.st_size
+        content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        if content_type.startswith('text/') or content_type == 'application/javascript':
+            content_type += '; charset=utf-8'
+        base['Accept-Ranges'] = 'bytes'
+        base['Last-Modified'] = email.utils.formatdate(st.st_mtime, usegmt=True)
+        if 'v' in parse_qs(urlsplit(target).query) or self.is_stored(path):
+            base['Cache-Control'] = 'public, max-age=31536000, immutable'
+        else:
+            base['Cache-Control'] = 'no-cache'
+        if self.is_compressible(content_type):
+            base['Vary'] = 'Accept-Encoding'
+
+        # The browser copy is still current
+        if etag_match(headers.get('if-none-match', ''), etag):
+            base['ETag'] = etag
+            await self.send(writer, 304, base, b'', method)
+            return
+
+        # Byte range of the uncompressed file (If-Range only honors the range if the file is unchanged)
+        span = None
+        if 'range' in headers and headers.get('if-range', etag) == etag:
+            span = byte_range(headers['range'], size)
+        if span is False:
+            base['Content-Range'] = f'bytes */{size}'
+            await self.send(writer, 416, base, b'', method)
+            return
+        base['Content-Type'] = content_type
+        if span is not None:
+            base['ETag'] = etag
+            base['Content-Range'] = f'bytes {span[0]}-{span[1]}/{size}'
+            await self.send_file(writer, 206, base, path, span[0], span[1] - span[0] + 1, method)
+            return
+
+        # Compressed text files
+        encoding = self.encoding(headers, content_type, size)
+        if encoding:
+            body = await loop.run_in_executor(self.executor, self.compress, path, signature, encoding)
+            base['ETag'] = etag[:-1] + '-' + encoding + '"'
+            base['Content-Encoding'] = encoding
+            await self.send(writer, 200, base, body, method)
+            return
+
+        base['ETag'] = etag
+        await self.send_file(writer, 200, base, path, 0, size, method)
+
+    async def send(self, writer: asyncio.StreamWriter, status: int, headers: dict, body: bytes, method: str):
+        """Write a complete response.
+
+        Args:
+            writer: connection stream
+            status: http status code
+            headers: response headers
+            body: response body (not sent for HEAD requests)
+            method: http method
+        """
+        if status not in [304]:
+            headers['Content-Length'] = str(len(body))
+        writer.write(self.status_line(status, headers))
+        if method != 'HEAD' and status != 304:
+            writer.write(body)
+        await writer.drain()
+
+    async def send_file(self, writer: asyncio.StreamWriter, status: int, headers: dict, path: str, offset: int,
+                        length: int, method: str):
+        """Stream part of a file in chunks read by the worker threads.
+
+        Args:
+            writer: connection stream
+            status: http status code
+            headers: response headers
+            path: file path
+            offset: first byte to send
+            length: number of bytes to send
+            method: http method
+        """
+        headers['Content-Length'] = str(length)
+        writer.write(self.status_line(status, headers))
+        if method == 'HEAD':
+            await writer.drain()
+            return
+
+        def read(input, size):
+            return input.read(size)
+
+        loop = asyncio.get_event_loop()
+        with open(path, 'rb') as input:
+            input.seek(offset)
+            while length > 0:
+                chunk = await loop.run_in_executor(self.executor, read, input, min(CHUNK, length))
+                if not chunk:
+                    break
+                length -= len(chunk)
+                writer.write(chunk)
+                await writer.drain()
+
+    async def start(self):
+        """Start listening (call from a running event loop)."""
+        from concurrent.futures import ThreadPoolExecutor
+        self.executor = ThreadPoolExecutor(max_workers=self.workers)
+        self.limit = asyncio.Semaphore(self.max_connections)
+        self.server = await asyncio.start_server(self.handle, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    def status_line(self, status: int, headers: dict) -> bytes:
+        """Make the status line and header block of a response."""
+        lines = [f'HTTP/1.1 {status} {STATUS[status]}', f'Date: {email.utils.formatdate(usegmt=True)}',
+                 'Server: pywebify']
+        lines += [f'{k}: {v}' for k, v in headers.items()]
+
+        return ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1')
+
+
+def serve(root: Union[str, Path], host: str = '127.0.0.1', port: int = 8000, open_path: Union[str, None] = None,
+          **kwargs):
+    """Serve a report directory until interrupted with Ctrl+C.
+
+    Args:
+        root: directory to serve
+        host: interface to bind; the default only accepts connections from this machine
+        port: port to bind
+        open_path: path of a file relative to root to open in the default browser once the server is running
+        kwargs: ReportServer keyword arguments
+    """
+    server = ReportServer(root, host, port, **kwargs)
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    try:
+        loop.run_until_complete(server.start())
+        print(f'Serving {server.root} at {server.url} (press Ctrl+C to stop)')
+        if open_path is not None:
+            import webbrowser
+            webbrowser.open(server.url + str(open_path).replace(os.sep, '/').replace(' ', '%20'))
+        loop.run_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+        loop.close()
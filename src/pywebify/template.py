@@ -9,16 +9,198 @@ __license__ = 'GPLv3'
 __version__ = '0.2'
 __url__ = 'https://github.com/endangeredoxen/pywebify'
 
+import io
 import os
 import string
-import pdb
+import threading
+from collections import OrderedDict
 from pathlib import Path
 from typing import Union
-db = pdb.set_trace
+db = breakpoint
+
+
+def compile_template(text: str) -> list:
+    """Split template text into literal strings and substitution placeholders.
+
+    The placeholders are found with the string.Template pattern so rendering the parts gives the same result as
+    string.Template.safe_substitute.
+
+    Args:
+        text: template text
+
+    Returns:
+        list of literal strings and (name, original placeholder text) tuples
+    """
+    parts = []
+    literal = []
+    pos = 0
+    for mo in string.Template.pattern.finditer(text):
+        literal += [text[pos:mo.start()]]
+        pos = mo.end()
+        name = mo.group('named') or mo.group('braced')
+        if name is not None:
+            parts += [''.join(literal), (name, mo.group())]
+            literal = []
+        elif mo.group('escaped') is not None:
+            literal += [string.Template.delimiter]
+        else:
+            literal += [mo.group()]
+    parts += [''.join(literal + [text[pos:]])]
+
+    return [f for f in parts if f != '']
+
+
+def populate(text: str, subs: dict, caps: bool = True) -> str:
+    """Populate template text held in memory (same output as Template.write).
+
+    Args:
+        text: template text
+        subs: replacement strings dict
+        caps: force uppercase on all dict keys
+
+    Returns:
+        populated text
+    """
+    output = io.StringIO()
+    Template([], subs).render(output, caps, parts=compile_template(text))
+    return output.getvalue()
+
+
+class Chunks():
+    def __init__(self, func, *args, **kwargs):
+        """Text made on demand by a generator function.
+
+        Iterating streams the chunks of a new call to func (i.e., a Jinja2
+        template writes a large sidebar with "{% for chunk in SIDEBAR %}"
+        without building it as one string) and str() joins all of them.
+
+        Args:
+            func: generator function that yields strings
+            args: positional arguments for func
+            kwargs: keyword arguments for func
+
+        """
+        self.args = args
+        self.func = func
+        self.kwargs = kwargs
+
+    def __iter__(self):
+        return iter(self.func(*self.args, **self.kwargs))
+
+    def __str__(self):
+        return ''.join(self)
+
+
+class TemplateCache():
+    def __init__(self, max_size: int = 256):
+        """Process-wide cache of compiled template files.
+
+        Each template file is read and compiled once and reused until its mtime or size changes.  The least recently
+        used files are dropped once more than max_size files are cached.
+
+        Args:
+            max_size: maximum number of cached template files
+
+        """
+        self.max_size = max_size
+        self.entries = OrderedDict()  # {path: (signature, compiled parts)}
+        self.hits = 0
+        self.lock = threading.Lock()
+        self.misses = 0
+
+    def clear(self, path: Union[str, Path, None] = None):
+        """Remove a template file (or every file) from the cache.
+
+        Args:
+            path: template file path; None clears the entire cache
+        """
+        with self.lock:
+            if path is None:
+                self.entries.clear()
+            else:
+                self.entries.pop(str(path), None)
+
+    def get(self, path: Union[str, Path]) -> list:
+        """Get the compiled parts of a template file.
+
+        Args:
+            path: template file path
+
+        Returns:
+            list of literal strings and (name, placeholder) tuples (see compile_template)
+        """
+        path = str(path)
+        st = os.stat(path)
+        signature = (st.st_mtime_ns, st.st_size)
+        with self.lock:
+            entry = self.entries.get(path)
+            if entry is not None and entry[0] == signature:
+                self.entries.move_to_end(path)
+                self.hits += 1
+                return entry[1]
+
+        with open(path, 'r') as input:
+            parts = compile_template(input.read())
+        with self.lock:
+            self.misses += 1
+            self.entries[path] = (signature, parts)
+            self.entries.move_to_end(path)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+        return parts
+
+
+TEMPLATE_CACHE = TemplateCache()
+JINJA_ENVIRONMENTS = {}  # {(template directory, bytecode cache directory): jinja2.Environment}
+JINJA_LOCK = threading.Lock()
+
+
+def clear_template_cache(path: Union[str, Path, None] = None):
+    """Invalidate a template file (or every file) in the process-wide template cache.
+
+    The loaded templates of the Jinja2 engine are always cleared entirely (compiled bytecode on disk is kept).
+
+    Args:
+        path: template file path; None clears the entire cache
+    """
+    TEMPLATE_CACHE.clear(path)
+    with JINJA_LOCK:
+        for env in JINJA_ENVIRONMENTS.values():
+            env.cache.clear()
+
+
+def jinja_environment(directory: Union[str, Path], bytecode_cache: Union[str, Path, None] = None):
+    """Get the shared Jinja2 environment for a template directory.
+
+    Environments are created once per process and keep their own cache of loaded templates (reloaded when the
+    template file changes).  Compiled templates are also stored in bytecode_cache so new processes skip the Jinja2
+    compile step.
+
+    Args:
+        directory: directory containing the template files
+        bytecode_cache: optional directory for the Jinja2 FileSystemBytecodeCache
+
+    Returns:
+        jinja2.Environment
+    """
+    import jinja2
+    key = (str(directory), str(bytecode_cache) if bytecode_cache else None)
+    with JINJA_LOCK:
+        env = JINJA_ENVIRONMENTS.get(key)
+        if env is None:
+            if bytecode_cache:
+                os.makedirs(bytecode_cache, exist_ok=True)
+                bytecode_cache = jinja2.FileSystemBytecodeCache(str(bytecode_cache))
+            env = jinja2.Environment(loader=jinja2.FileSystemLoader(str(directory)), bytecode_cache=bytecode_cache,
+                                     keep_trailing_newline=True, autoescape=False)
+            JINJA_ENVIRONMENTS[key] = env
+    return env
 
 
 class Template():
-    def __init__(self, template_paths: Union[str, Path, list], subs: Union[dict, list]):
+    def __init__(self, template_paths: Union[str, Path, list], subs: Union[dict, list], cache: bool = True,
+                 engine: str = 'string', bytecode_cache: Union[str, Path, None] = None):
         """ Template maker
 
         Replaces strings within a specified template in order to make a
@@ -27,6 +209,12 @@ class Template():
         Args:
             template_paths (str):  path to template file
             subs (dict|list):  replacement strings dict or list of dicts
+            cache (bool): reuse the compiled template files from the process-wide
+                template cache (disable for one-off files; Jinja2 templates are
+                always cached by their environment)
+            engine (str): "string" for $NAME placeholders (string.Template
+                syntax) or "jinja" to render Jinja2 templates
+            bytecode_cache (str): directory of the Jinja2 bytecode cache
 
         """
 
@@ -34,6 +222,9 @@ class Template():
         if not isinstance(template_paths, list):
             template_paths = [template_paths]
         self.template_paths = template_paths
+        self.bytecode_cache = bytecode_cache
+        self.cache = cache
+        self.engine = engine
 
         # Init the raw html output varialbe
         self.raw = ''
@@ -46,6 +237,24 @@ class Template():
         else:
             self.subs = subs[0]
 
+    def load(self) -> list:
+        """ Compile the template files
+
+        Returns:
+            list of literal strings and (name, placeholder) tuples of all
+            template files joined by newlines
+        """
+        parts = []
+        for i, tp in enumerate(self.template_paths):
+            if i > 0:
+                parts += ['\n']
+            if self.cache:
+                parts += TEMPLATE_CACHE.get(tp)
+            else:
+                with open(tp, 'r') as input:
+                    parts += compile_template(input.read())
+        return parts
+
     def merge_dicts(self, subs):
         """ Combine multiple dictionaries in to one
 
@@ -61,6 +270,54 @@ class Template():
             merged.update(subs[i])
         return merged
 
+    def render(self, stream, caps: bool = True, bonus: str = '', parts: Union[list, None] = None):
+        """ Write the populated template to a stream
+
+        Args:
+            stream: file-like object with a write method
+            caps: force uppercase on all dict keys
+            bonus: additional text to add to the end
+            parts: compiled template (defaults to self.load())
+        """
+        if self.engine == 'jinja' and parts is None:
+            self.render_jinja(stream, caps)
+            stream.write('\n' + bonus)
+            return
+        if parts is None:
+            parts = self.load()
+        subs = self.subs if not caps else dict((k.upper(), v) for k, v in self.subs.items())
+        write = stream.write
+        for pp in parts:
+            if isinstance(pp, str):
+                write(pp)
+            elif pp[0] in subs:
+                write(str(subs[pp[0]]))
+            else:
+                write(pp[1])
+        write('\n' + bonus)
+
+    def render_jinja(self, stream, caps: bool = True):
+        """ Stream the populated Jinja2 templates
+
+        The output of Template.generate is written to the stream as it is
+        produced instead of being joined in to one string.
+
+        Args:
+            stream: file-like object with a write method
+            caps: also pass all dict keys in uppercase
+        """
+        subs = dict(self.subs)
+        if caps:
+            subs.update((k.upper(), v) for k, v in self.subs.items())
+        write = stream.write
+        for i, tp in enumerate(self.template_paths):
+            if i > 0:
+                write('\n')
+            tp = Path(tp)
+            env = jinja_environment(tp.parent, self.bytecode_cache)
+            for chunk in env.get_template(tp.name).generate(**subs):
+                write(chunk)
+
     def substitute(self, caps=None):
         """ String substitution
 
@@ -71,9 +328,9 @@ class Template():
             none:  self.raw updated
         """
 
-        if caps:
-            self.subs = dict((k.upper(), v) for k, v in self.subs.items())
-        self.raw = self.raw.safe_substitute(self.subs)
+        output = io.StringIO()
+        self.render(output, caps)
+        self.raw = output.getvalue()[:-1]
 
     def write(self, dest: Union[Path, str, None] = None, caps: bool = True, bonus: str = ''):
         """Write the updated template to file.
@@ -86,19 +343,17 @@ class Template():
         Returns:
             if dest==None, return self.raw
         """
-        raw = []
-        for tp in self.template_paths:
-            with open(tp, 'r') as input:
-                raw += [input.read()]
-        self.raw = string.Template('\n'.join(raw))
-        self.substitute(caps)
-        self.raw = self.raw + '\n' + bonus
+        # Compile before opening dest in case it is also the template
+        parts = self.load() if self.engine != 'jinja' else None
         if dest:
             if isinstance(dest, str):
                 dest = Path(dest)
             if not os.path.exists(dest.parent):
                 os.makedirs(dest.parent)
             with open(dest, 'w') as temp:
-                temp.write(self.raw)
+                self.render(temp, caps, bonus, parts)
         else:
+            output = io.StringIO()
+            self.render(output, caps, bonus, parts)
+            self.raw = output.getvalue()
             return self.raw
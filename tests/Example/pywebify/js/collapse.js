@@ -1,37 +1,176 @@
 /*******************************************************************************/
 /* Makes the file list ul dynamically expandable/collapsible                   */
 /*   Modified from http://jasalguero.com/ledld/development/web/expandable-list */
+/*   Folders are li elements with the "collapsed" class; adding "expanded"     */
+/*   shows their sub-list (see collapse.css) so no per-node handlers or        */
+/*   inline styles are needed                                                  */
 /*   Designed for the PyWebify project                                         */
 /*   https://github.com/endangeredoxen/pywebify                                */
 /*******************************************************************************/
 
+var pywebifyTimes = {};  // duration of each sidebar setup step in ms
+
+
+function collapse_timing(name, start) {
+    // Timing hook: record the time since start (from performance.now()) on the browser performance timeline (shown
+    // in the dev tools), in pywebifyTimes, and pass it to a pywebifyTiming(name, ms) function if the page has one
+    var ms = performance.now() - start;
+    pywebifyTimes[name] = ms;
+    if (performance.measure) {
+        try {
+            performance.measure('pywebify ' + name, {start: start, duration: ms});
+        } catch (err) {
+            // older browsers without User Timing Level 3
+        }
+    }
+    if (typeof pywebifyTiming === 'function') {
+        pywebifyTiming(name, ms);
+    }
+    return ms;
+}
+
+
+function collapse_splitext(name) {
+    // Same as python's os.path.splitext (leading dots are not an extension)
+    var start = 0;
+    while (name.charAt(start) == '.') {
+        start++;
+    }
+    var dot = name.lastIndexOf('.');
+    if (dot < start) {
+        return [name, ''];
+    }
+    return [name.slice(0, dot), name.slice(dot)];
+}
+
+
+function collapse_href(path) {
+    // Same as Dir2HTML.href
+    var value = '?id=' + path.replace(/ /g, '%20');
+    var slash = value.lastIndexOf('/') + 1;
+    return value.slice(0, slash) + collapse_splitext(value.slice(slash))[0];
+}
+
+
+function collapse_call(name, path) {
+    // Call a function from the config file by name (i.e., "div_switch" or "window.open")
+    var parts = name.split('.');
+    var obj = window;
+    for (var i = 0; i < parts.length - 1; i++) {
+        obj = obj[parts[i]];
+    }
+    return obj[parts[parts.length - 1]](path);
+}
+
+
+function collapse_find(href) {
+    // Links of the compact markup that match a ?id= deep link
+    var links = document.querySelectorAll('#sidebar a[data-path]');
+    for (var i = 0; i < links.length; i++) {
+        if (collapse_href(links[i].getAttribute('data-path')) == href) {
+            return [links[i]];
+        }
+    }
+    return [];
+}
+
+
+function collapse_links() {
+    // Compact markup stores the path of each link once in data-path; one delegated listener per event calls the
+    // functions named by data-onmouseover (files only) and data-onclick of the top-level list
+    var root = $('#sidebar > ul');
+    var onmouseover = root.attr('data-onmouseover');
+    var onclick = root.attr('data-onclick');
+    $('#sidebar').off('mouseover.links click.links');
+    if (onmouseover) {
+        $('#sidebar').on('mouseover.links', 'li:not(.collapsed) > a[data-path]', function() {
+            collapse_call(onmouseover, this.getAttribute('data-path'));
+        });
+    }
+    if (onclick) {
+        $('#sidebar').on('click.links', 'a[data-path]', function() {
+            collapse_call(onclick, this.getAttribute('data-path'));
+            return false;
+        });
+    }
+}
+
+
+function collapse_deep_link() {
+    // Automatically open to a specific image if ?id=path in url
+    var url = window.location.href;
+    var queryString = url ? url.split('?')[1] : window.location.search.slice(1);
+    if (typeof queryString === "undefined") {
+        return;
+    }
+    var page = queryString.split('id=')[1].replace(new RegExp('%20', 'g'), ' ');
+    var pages = page.split('/');
+    var i;
+    var child;
+    var aTags = document.querySelectorAll("a[href='?" + queryString + "']");
+    if (aTags.length == 0) {
+        // compact sidebar markup
+        aTags = collapse_find('?' + queryString);
+    }
+    if (aTags.length > 0) {
+        var parent = aTags[0].parentElement;
+        if (aTags[0].hasAttribute('data-path') && !parent.classList.contains('collapsed')) {
+            aTags[0].dispatchEvent(new MouseEvent('mouseover', {bubbles: true}));
+            for (var i = 0; i < (pages.length - 1) * 2; i++) {
+                parent = parent.parentElement;
+                parent.click();
+            }
+        } else if (parent.children[0].onmouseover != null) {
+            parent.children[0].onmouseover();
+            for (var i = 0; i < (pages.length - 1) * 2; i++) {
+                parent = parent.parentElement;
+                parent.click();
+            }
+        } else {
+            // directories only
+            for (var i = 0; i < pages.length * 2; i++) {
+                parent.click();
+                parent = parent.parentElement;
+            }
+        }
+    }
+}
+
 
 function prepareList() {
-    $('#collapse').find('li:has(ul)')
-    .click( function(event) {
+    var start = performance.now();
+
+    // One delegated handler toggles every folder, including folders added later by sidebar.js
+    $('#sidebar')
+    .off('click.collapse')
+    .on('click.collapse', 'li.collapsed', function(event) {
         if (this == event.target) {
+            if (typeof sidebar_build === 'function') {
+                sidebar_build(this);
+            }
             $(this).toggleClass('expanded');
-            $(this).children('ul').toggle();
         }
         return false;
-    })
-    .addClass('collapsed')
-    .children('ul').hide();
-
+    });
 
     //Create the button funtionality
     $('#expandList')
     .unbind('click')
     .click( function() {
-        $('.collapsed').addClass('expanded');
-        $('.collapsed').children().show();
+        if (typeof sidebar_build_all === 'function') {
+            sidebar_build_all();
+        }
+        $('#sidebar li.collapsed').addClass('expanded');
     })
     $('#collapseList')
     .unbind('click')
     .click( function() {
-        location.reload();
+        $('#sidebar li.expanded').removeClass('expanded');
     })
 
+    collapse_links();
+
+    collapse_timing('collapse', start);
 };
 
 
@@ -39,7 +178,6 @@ function prepareList() {
 /* Functions to execute on loading the document               */
 /**************************************************************/
 $(document).ready( function() {
-//    document.getElementById('sidebar').innerHTML = '<div class="listControl"><a id="expandList">Expand All</a><a id="collapseList">Collapse All</a></div>';
     $('#sidebar').prepend('<div class="listControl"><a id="expandList">Expand All</a><a id="collapseList">Collapse All</a></div>');
     prepareList()
-});
\ No newline at end of file
+});
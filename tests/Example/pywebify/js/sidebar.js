@@ -0,0 +1,169 @@
+/*******************************************************************************/
+/* Lazy-loaded file list                                                       */
+/*   Builds the file list ul from the json tree written by PyWebify, one       */
+/*   folder at a time as folders are expanded (requires collapse.js)           */
+/*   Designed for the PyWebify project                                         */
+/*   https://github.com/endangeredoxen/pywebify                                */
+/*******************************************************************************/
+
+
+function sidebar_link(name, path, dir) {
+    // Make the same <A> element as Dir2HTML.write_ul
+    var a = document.createElement('A');
+    if (pywebifySidebar.compact) {
+        a.setAttribute('data-path', path);
+        a.appendChild(document.createTextNode(name));
+        return a;
+    }
+    if (!dir) {
+        a.id = 'image_link';
+    }
+    if (pywebifySidebar.onmouseover && !dir) {
+        a.setAttribute('onmouseover', pywebifySidebar.onmouseover + "('" + path + "')");
+    }
+    if (pywebifySidebar.onclick) {
+        a.setAttribute('onclick', pywebifySidebar.onclick + "('" + path + "')");
+        a.setAttribute('href', collapse_href(path));
+    }
+    a.appendChild(document.createTextNode(name));
+    return a;
+}
+
+
+var sidebar_root = null;   // pseudo folder item holding the top-level items
+var sidebar_index = null;  // [folder item, position] of each file in sidebar order
+
+
+function sidebar_items(items, parent, container) {
+    // Add the li elements of one folder level to container and return them
+    var prefix = parent ? parent + '/' : '';
+    var fragment = document.createDocumentFragment();
+    var lis = [];
+    for (var i = 0; i < items.length; i++) {
+        var item = items[i];
+        var li = document.createElement('li');
+        if (typeof item == 'string') {
+            li.appendChild(sidebar_link(collapse_splitext(item)[0], prefix + item, false));
+        } else if (Array.isArray(item)) {
+            li.appendChild(sidebar_link(collapse_splitext(item[0])[0], item[1], false));
+        } else {
+            var path = item.p !== undefined ? item.p : prefix + item.n;
+            li.appendChild(sidebar_link(item.n, path, true));
+            li.className = 'collapsed';
+            li.sidebarItem = item;
+            li.sidebarPath = path;
+            item.li = li;
+        }
+        fragment.appendChild(li);
+        lis.push(li);
+    }
+    container.appendChild(fragment);
+    return lis;
+}
+
+
+function sidebar_build(li) {
+    // Build the sub-list of a folder the first time it is needed (called by the collapse.js click handler)
+    if (li.sidebarItem === undefined || li.sidebarBuilt) {
+        return;
+    }
+    var ul = document.createElement('ul');
+    if (!pywebifySidebar.compact) {
+        ul.id = 'collapse';
+    }
+    li.sidebarItem.lis = sidebar_items(li.sidebarItem.c, li.sidebarPath, ul);
+    li.appendChild(ul);
+    li.sidebarBuilt = true;
+}
+
+
+function sidebar_file(id) {
+    // Build the folders above the id-th file in sidebar order (same order as Dir2HTML.search_index) and return its li
+    if (sidebar_index === null) {
+        sidebar_index = [];
+        var walk = function(folder) {
+            for (var i = 0; i < folder.c.length; i++) {
+                var item = folder.c[i];
+                if (typeof item == 'string' || Array.isArray(item)) {
+                    sidebar_index.push([folder, i]);
+                } else {
+                    item.parent = folder;
+                    walk(item);
+                }
+            }
+        };
+        walk(sidebar_root);
+    }
+    var entry = sidebar_index[id];
+    var folders = [];
+    for (var folder = entry[0]; folder !== sidebar_root; folder = folder.parent) {
+        folders.push(folder);
+    }
+    for (var i = folders.length - 1; i >= 0; i--) {
+        sidebar_build(folders[i].li);
+    }
+    return entry[0].lis[entry[1]];
+}
+
+
+function sidebar_children(li) {
+    // Folder li elements directly below li (or below the top-level list)
+    return $(li).children('ul').children('li.collapsed').toArray();
+}
+
+
+function sidebar_open(query) {
+    // Build the folders leading to a ?id= deep link so the report onload handler can find the link
+    var target = '?' + query;
+    var lis = $('#sidebar > ul').children('li.collapsed').toArray();
+    var i = 0;
+    while (i < lis.length) {
+        var li = lis[i];
+        var prefix = '?id=' + li.sidebarPath.replace(/ /g, '%20') + '/';
+        if (target.indexOf(prefix) == 0) {
+            sidebar_build(li);
+            lis = sidebar_children(li);
+            i = 0;
+        } else {
+            i++;
+        }
+    }
+}
+
+
+function sidebar_build_all() {
+    // Build every folder (called by Expand All in collapse.js)
+    var lis = $('#sidebar > ul').children('li.collapsed').toArray();
+    while (lis.length > 0) {
+        var li = lis.pop();
+        sidebar_build(li);
+        var children = sidebar_children(li);
+        for (var i = 0; i < children.length; i++) {
+            lis.push(children[i]);
+        }
+    }
+}
+
+
+function prepareSidebar() {
+    var start = performance.now();
+    sidebar_root = {c: pywebifySidebar.tree};
+    sidebar_root.lis = sidebar_items(sidebar_root.c, '', $('#sidebar > ul')[0]);
+
+    var url = window.location.href;
+    var queryString = url ? url.split('?')[1] : window.location.search.slice(1);
+    if (typeof queryString !== "undefined") {
+        sidebar_open(queryString);
+    }
+    collapse_timing('sidebar', start);
+};
+
+
+/**************************************************************/
+/* Functions to execute on loading the document               */
+/**************************************************************/
+$(document).ready( function() {
+    if (typeof pywebifySidebar !== "undefined") {
+        prepareSidebar()
+    }
+});
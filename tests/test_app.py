@@ -0,0 +1,132 @@
+import asyncio
+import os
+import shutil
+import threading
+import pytest
+import pywebify.app as pa
+from pathlib import Path
+CUR_DIR = Path(os.path.dirname(__file__))
+
+
+@pytest.fixture
+def share(tmp_path):
+    example = tmp_path / 'share' / 'Example'
+    shutil.copytree(CUR_DIR / 'Example', example, ignore=shutil.ignore_patterns('pywebify', 'report.html'))
+    os.remove(example / 'Data Files' / 'Summary.html')
+    return tmp_path / 'share'
+
+
+def get(app, path, method='GET'):
+    result = {}
+
+    def start_response(status, headers):
+        result['status'] = int(status.split()[0])
+        result['headers'] = dict(headers)
+
+    body = b''.join(app({'REQUEST_METHOD': method, 'PATH_INFO': path, 'SCRIPT_NAME': ''}, start_response))
+    return result['status'], result['headers'], body
+
+
+def test_report_app(share, tmp_path):
+    app = pa.ReportApp(share, config=str(CUR_DIR / 'config_with_index.ini'), asset_path=tmp_path / 'assets',
+                       refresh=0)
+    status, headers, _ = get(app, '/Example')
+    assert status == 301 and headers['Location'] == '/Example/'
+
+    # the report is built in memory on the first request
+    status, headers, body = get(app, '/Example/')
+    assert status == 200 and b'mzis' in body
+    assert not (share / 'Example' / 'report.html').exists()
+    assert not (share / 'Example' / 'pywebify').exists()
+    report = app.reports[str(share / 'Example')]
+    assert get(app, '/Example/')[2] == body
+    assert app.reports[str(share / 'Example')] is report
+
+    # setup files and json data scripts
+    status, headers, body = get(app, f'/Example/pywebify/css/{report.report_filename}_search.js')
+    assert status == 200 and body.startswith(b'var pywebifySearch = ')
+    assert get(app, f'/Example/pywebify/css/{report.report_filename}.css')[0] == 200
+    assert get(app, '/Example/pywebify/js/collapse.js')[0] == 200
+    status, headers, body = get(app, '/Example/Microscopy/mzis.jpg')
+    assert status == 200 and headers['Content-Type'] == 'image/jpeg'
+    assert len(body) == os.path.getsize(share / 'Example' / 'Microscopy' / 'mzis.jpg')
+
+    # rst files are compiled on first view
+    assert b'Data Files/Summary.html' in report.body
+    status, headers, body = get(app, '/Example/Data Files/Summary.html')
+    assert status == 200 and b'<html' in body
+    assert (share / 'Example' / 'Data Files' / 'Summary.html').exists()
+
+    # new files rebuild the report, reusing the unchanged directory listings
+    shutil.copy(share / 'Example' / 'Microscopy' / 'mzis.jpg', share / 'Example' / 'Microscopy' / 'new plot.jpg')
+    assert b'new plot' in get(app, '/Example/')[2]
+    assert app.reports[str(share / 'Example')] is not report
+
+    assert get(app, '/Example/missing.png')[0] == 404
+    assert get(app, '/../secret.txt')[0] == 404
+    assert get(app, '/Example/', method='POST')[0] == 405
+
+
+def test_report_app_paths(share, tmp_path):
+    app = pa.ReportApp(share, config=str(CUR_DIR / 'config_with_index.ini'), asset_path=tmp_path / 'assets')
+    (tmp_path / 'secret.png').write_bytes(b'secret')
+    os.symlink(tmp_path / 'secret.png', share / 'Example' / 'Microscopy' / 'link.png')
+    os.symlink(tmp_path, share / 'Example' / 'outside')
+    assert get(app, '/Example/Microscopy/link.png')[0] == 404
+    assert get(app, '/Example/outside/secret.png')[0] == 404
+    assert get(app, '/Example/outside/')[0] == 404
+
+    # folders named like setup_subdir deeper in a report are regular folders
+    os.makedirs(share / 'Example' / 'pywebify' / 'results')
+    shutil.copy(share / 'Example' / 'Microscopy' / 'mzis.jpg', share / 'Example' / 'pywebify' / 'results')
+    assert get(app, '/Example/pywebify/results/mzis.jpg')[0] == 200
+    assert get(app, '/Example/')[0] == 200
+    assert get(app, '/Example/pywebify/js/collapse.js')[0] == 200
+
+
+def test_report_app_cache(share, tmp_path, monkeypatch):
+    builds = []
+
+    class CountingReport(pa.DirectoryReport):
+        def __init__(self, base_path, *args, **kwargs):
+            builds.append(str(base_path))
+            super().__init__(base_path, *args, **kwargs)
+
+    monkeypatch.setattr(pa, 'DirectoryReport', CountingReport)
+    app = pa.ReportApp(share, config=str(CUR_DIR / 'config_with_index.ini'), asset_path=tmp_path / 'assets',
+                       cache_size=2)
+
+    # concurrent requests share one build
+    threads = [threading.Thread(target=get, args=(app, '/Example/')) for i in range(8)]
+    for tt in threads:
+        tt.start()
+    for tt in threads:
+        tt.join()
+    assert builds == [str(share / 'Example')]
+
+    # least recently used reports are dropped
+    for path in ['/Example/Microscopy/', '/Example/Data Files/', '/Example/Microscopy/']:
+        assert get(app, path)[0] == 200
+    assert list(app.reports.keys()) == [str(share / 'Example' / 'Data Files'), str(share / 'Example' / 'Microscopy')]
+    assert len(builds) == 3
+
+
+def test_report_app_asgi(share, tmp_path):
+    app = pa.ReportApp(share, config=str(CUR_DIR / 'config_with_index.ini'), asset_path=tmp_path / 'assets')
+    messages = []
+
+    async def receive():
+        return {'type': 'http.request'}
+
+    async def send(message):
+        messages.append(message)
+
+    loop = asyncio.new_event_loop()
+    loop.run_until_complete(app.asgi({'type': 'http', 'method': 'GET', 'path': '/Example/'}, receive, send))
+    loop.run_until_complete(app.asgi({'type': 'http', 'method': 'GET', 'path': '/Example/Microscopy/mzis.jpg'},
+                                     receive, send))
+    loop.close()
+    assert messages[0]['status'] == 200 and b'mzis' in messages[1]['body']
+    assert messages[2]['status'] == 200
+    image = b''.join(m['body'] for m in messages[3:])
+    assert image == (share / 'Example' / 'Microscopy' / 'mzis.jpg').read_bytes()
@@ -0,0 +1,150 @@
+import os
+import pytest
+import shutil
+import pywebify
+import pywebify.assets as pa
+from pathlib import Path
+CUR_DIR = Path(os.path.dirname(__file__))
+
+
+@pytest.fixture
+def asset(tmp_path):
+    src = tmp_path / 'src' / 'jquery.min.js'
+    src.parent.mkdir()
+    src.write_text('var jquery;')
+    return src
+
+
+@pytest.mark.parametrize('mode', pa.MODES)
+def test_deploy_file(tmp_path, asset, mode):
+    dest = tmp_path / 'dest' / 'jquery.min.js'
+    assert pa.deploy_files([(asset, dest)], mode=mode) == [dest]
+    assert dest.read_text() == 'var jquery;'
+    if mode == 'symlink':
+        assert os.path.islink(dest)
+    elif mode == 'hardlink':
+        assert os.path.samefile(asset, dest)
+
+    # unchanged files are skipped
+    assert not pa.deploy_file(asset, dest, mode=mode)
+
+    # changed files are replaced (symlinks already point at the new file)
+    asset.unlink()
+    asset.write_text('var jquery = 2;')
+    assert pa.deploy_file(asset, dest, mode=mode) is (mode != 'symlink')
+    assert dest.read_text() == 'var jquery = 2;'
+    assert os.listdir(dest.parent) == ['jquery.min.js']
+
+
+def test_deploy_file_check(tmp_path, asset):
+    dest = tmp_path / 'jquery.min.js'
+    pa.deploy_file(asset, dest)
+    assert os.stat(dest).st_mtime_ns == os.stat(asset).st_mtime_ns
+
+    # a touched file with the same contents is only skipped by the hash check
+    os.utime(asset, ns=(0, 0))
+    assert not pa.deploy_file(asset, dest, check='hash')
+    assert pa.deploy_file(asset, dest)
+
+
+@pytest.mark.parametrize('mode', ['hardlink', 'symlink'])
+def test_deploy_file_fallback(tmp_path, asset, mode, monkeypatch):
+    # links that are not supported (i.e., across devices) fall back to copies that are skipped on the next build
+    def fail(*args):
+        raise OSError('not supported')
+    monkeypatch.setattr(os, 'link', fail)
+    monkeypatch.setattr(os, 'symlink', fail)
+    dest = tmp_path / 'jquery.min.js'
+    assert pa.deploy_file(asset, dest, mode=mode)
+    assert not os.path.islink(dest) and not os.path.samefile(asset, dest)
+    assert not pa.deploy_file(asset, dest, mode=mode)
+
+
+def test_deploy_files_parallel(tmp_path):
+    files = []
+    for ii in range(20):
+        (tmp_path / f'{ii}.png').write_bytes(bytes([ii]) * 100)
+        files += [(tmp_path / f'{ii}.png', tmp_path / 'img' / f'{ii}.png')]
+    assert len(pa.deploy_files(files, workers=4)) == 20
+    assert pa.deploy_files(files, workers=4) == []
+    assert (tmp_path / 'img' / '7.png').read_bytes() == bytes([7]) * 100
+
+
+def test_move_files(tmp_path):
+    (tmp_path / 'plot.png').touch()
+    pw = pywebify.PyWebify(tmp_path, config=str(CUR_DIR / 'config_with_index.ini'), open=False, make=False,
+                           asset_mode='hardlink')
+    pw.setup_path = tmp_path / 'pywebify'
+    pw.move_files(['js/collapse.js', 'missing.js'])
+    assert os.path.samefile(pw.setup_path / 'js' / 'collapse.js', Path(pa.__file__).parent / 'js' / 'collapse.js')
+    assert os.listdir(pw.setup_path) == ['js']
+
+
+def test_store_file(tmp_path, asset):
+    store = tmp_path / 'store'
+    name = pa.store_file(asset, store, mode='symlink')
+    assert pa.STORED.search(name) and name.startswith('jquery.min.')
+    assert not os.path.islink(store / name)
+    assert pa.store_file(asset, store) == name
+
+    # changed files get a new name and the old one is kept for other reports
+    asset.write_text('var jquery = 2;')
+    assert pa.store_file(asset, store) != name
+    assert len(os.listdir(store)) == 2
+
+
+def test_asset_store(tmp_path):
+    reports = []
+    for name in ['one', 'two']:
+        shutil.copytree(CUR_DIR / 'Example' / 'Microscopy', tmp_path / name)
+        reports += [pywebify.PyWebify(tmp_path / name, config=str(CUR_DIR / 'config_with_index.ini'), open=False,
+                                      asset_store=tmp_path / 'static')]
+    stored = sorted(os.listdir(tmp_path / 'static'))
+    assert len(stored) == len(set(f.split('.')[0] for f in stored))  # one copy of each file
+
+    # each report only has its own css and data
+    pw = reports[1]
+    assert sorted(os.listdir(pw.setup_path)) == ['css']
+    with open(pw.report_path / f'{pw.report_filename}.html', 'r') as input:
+        html = input.read()
+    collapse = [f for f in stored if f.startswith('collapse')][0]
+    assert f'src="../static/{collapse}"' in html
+    assert 'href="../static/favicon.' in html
+    with open(pw.setup_path / 'css' / f'{pw.report_filename}.css', 'r') as input:
+        css = input.read()
+    assert 'url(../../../static/collapsed.' in css and '../img/' not in css
+
+    # a fixed url for a served store
+    pw = pywebify.PyWebify(tmp_path / 'two', config=str(CUR_DIR / 'config_with_index.ini'), open=False,
+                           asset_store=tmp_path / 'static', asset_store_url='/static/')
+    assert pw.asset_url('js/collapse.js') == f'/static/{collapse}'
+
+    # the local http server serves a store outside of the report directory at a fixed url
+    pw = pywebify.PyWebify(tmp_path / 'two', config=str(CUR_DIR / 'config_with_index.ini'), make=False, serve=True,
+                           asset_store=tmp_path / 'static')
+    assert pw.asset_url('js/collapse.js') == f'{pywebify.STORE_URL}/{collapse}'
+    pw = pywebify.PyWebify(tmp_path, config=str(CUR_DIR / 'config_with_index.ini'), make=False, serve=True,
+                           asset_store=tmp_path / 'static')
+    assert pw.asset_url('js/collapse.js') == f'static/{collapse}'
+
+
+def test_asset_store_icons(tmp_path):
+    (tmp_path / 'logo.png').write_bytes(b'logo')
+    with open(CUR_DIR / 'config_with_index.ini', 'r') as input:
+        config = input.read().replace(r'favicon = pywebify\img', r'favicon = setup\pywebify\img')
+    config = config.replace(r'logo    = pywebify\img\favicon.png', f'logo    = {tmp_path / "logo.png"}')
+    (tmp_path / 'config.ini').write_text(config)
+    shutil.copytree(CUR_DIR / 'Example' / 'Microscopy', tmp_path / 'report')
+
+    # the logo is copied to each report without a store
+    pw = pywebify.PyWebify(tmp_path / 'report', config=str(tmp_path / 'config.ini'), make=False,
+                           setup_subdir='setup/pywebify')
+    assert os.listdir(tmp_path / 'report' / 'setup' / 'pywebify' / 'img') == ['logo.png']
+    shutil.rmtree(tmp_path / 'report' / 'setup')
+
+    # and stored once with a store
+    pw = pywebify.PyWebify(tmp_path / 'report', config=str(tmp_path / 'config.ini'), make=False,
+                           setup_subdir='setup/pywebify', asset_store=tmp_path / 'static')
+    assert pw.special['FAVICON'].startswith('../static/favicon.')
+    assert not (tmp_path / 'report' / 'setup').exists()
+    assert len([f for f in os.listdir(tmp_path / 'static') if f.startswith('logo.')]) == 1
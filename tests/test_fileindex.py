@@ -0,0 +1,61 @@
+import os
+import pywebify
+pf = pywebify.fileindex
+
+
+def records():
+    base = os.path.join(os.sep, 'data')
+    sub = os.path.join(base, 'run1')
+    deep = os.path.join(sub, 'plots')
+    return [pf.FileRecord(base, deep, os.path.join('run1', 'plots'), ('run1', 'plots'), 'a.png'),
+            pf.FileRecord(base, sub, 'run1', ('run1', ), 'b.png'),
+            pf.FileRecord(base, deep, os.path.join('run1', 'plots'), ('run1', 'plots'), 'c.png'),
+            pf.FileRecord(base, base, '', (), 'top.png', relative=False)]
+
+
+def test_file_record():
+    rr = records()[0]
+    assert rr.full_path == os.path.join(os.sep, 'data', 'run1', 'plots', 'a.png')
+    assert rr.rel_path == os.path.join('run1', 'plots', 'a.png')
+    assert rr.html_path == rr.rel_path
+    assert (rr.filename, rr.ext) == ('a', 'png')
+    rr.ext = 'html'
+    assert rr.name == 'a.html'
+
+    top = records()[-1]
+    assert top.rel_path == 'top.png'
+    assert top.html_path.startswith('file://')
+
+
+def test_file_index_tree():
+    index = pf.FileIndex(records())
+    assert len(index) == 4
+    assert len(index[:2]) == 2
+
+    root = index.tree()
+    assert root.order == ['run1', None]
+    run1 = root.children['run1']
+    assert run1.dir == os.path.join(os.sep, 'data', 'run1')
+    assert run1.order == ['plots', None]
+    assert [f.name for f in run1.children['plots'].files] == ['a.png', 'c.png']
+    assert run1.children['plots'].dir == os.path.join(os.sep, 'data', 'run1', 'plots')
+    assert [f.name for f in root.nodes()] == ['run1', 'plots']
+    assert root.children['run1'].path is None
+
+
+def test_file_index_tree_single_pass():
+    # contiguous records of one directory are added without walking the trie
+    rr = records()
+    rr = rr[:1] + [pf.FileRecord(rr[0].base_path, rr[0].dir, rr[0].rel_dir, rr[0].parts, 'd.png')] + rr[1:]
+    root = pf.FileIndex(rr).tree()
+    plots = root.children['run1'].children['plots']
+    assert [f.name for f in plots.files] == ['a.png', 'd.png', 'c.png']
+    assert plots.order == [None]
+    assert root.add(rr[0]) is plots
+
+
+def test_file_index_to_dataframe():
+    df = pf.FileIndex(records()).to_dataframe()
+    assert list(df.columns) == ['full_path', 'rel_path', 'html_path', 'ext', 'base_path', 'subdir0', 'subdir1',
+                                'filename_ext', 'filename', 'link']
+    assert list(df.subdir1) == ['plots', 'nan', 'plots', 'nan']
@@ -1,5 +1,6 @@
 import pytest
 import pywebify
+import io
 import os
 from pathlib import Path
 ph = pywebify.html
@@ -32,3 +33,300 @@ def test_dir2html_from_file_list():
 
     d2h = ph.Dir2HTML(CUR_DIR / 'file_list.csv', ext=['jpg', 'png'], from_file=True)
     assert len(d2h.files) == 4
+
+
+def test_dir2html_scan():
+    d2h = ph.Dir2HTML(CUR_DIR / 'Example', ext=['jpg', 'png'])
+    row = [f for f in d2h.files if f.filename == 'eye_diagrams'][0]
+    base = (CUR_DIR / 'Example').resolve()
+    assert row.full_path == str(base / 'Data Files' / 'BER' / 'eye_diagrams.png')
+    assert row.rel_path == os.path.join('Data Files', 'BER', 'eye_diagrams.png')
+    assert row.html_path == row.rel_path
+    assert (row.parts, row.ext, row.filename_ext) == (('Data Files', 'BER'), 'png', 'png')
+
+    # stat data kept from the directory scan
+    assert d2h.stats[row.full_path][1] == os.path.getsize(row.full_path)
+
+    # top level files are listed last and have no subdirs
+    assert d2h.files[-1].filename == 'file_with_a_really_long_filename_to_observe_word_wrapping_issues'
+    assert d2h.files[-1].parts == ()
+
+    # legacy DataFrame format
+    df = d2h.files.to_dataframe()
+    assert len(df) == len(d2h.files)
+    assert df.iloc[0].subdir1 == 'BER'
+    assert df.iloc[-1].subdir0 == 'nan'
+
+
+def test_dir2html_scan_parallel():
+    serial = ph.Dir2HTML(CUR_DIR / 'Example', ext=['jpg', 'png', 'html'], natsort=False)
+    parallel = ph.Dir2HTML(CUR_DIR / 'Example', ext=['jpg', 'png', 'html'], natsort=False, scan_workers=4)
+    assert [f.key() for f in parallel.files] == [f.key() for f in serial.files]
+    assert parallel.stats == serial.stats
+    assert parallel.write_ul(io.StringIO()).getvalue() == serial.write_ul(io.StringIO()).getvalue()
+
+
+def test_make_rst_parallel(tmp_path):
+    path = tmp_path / 'rst'
+    os.makedirs(path)
+    for name in ['one', 'two', 'three']:
+        with open(path / f'{name}.rst', 'w') as output:
+            output.write(f'{name}\n=====\n\nText for {name}\n')
+    with open(path / 'bad.rst', 'wb') as output:
+        output.write(b'Bad\n===\n\n\xff\xfa not utf-8\n')
+    (path / 'one.png').touch()
+
+    d2h = ph.Dir2HTML(tmp_path, ext=['rst', 'html', 'png'], rst_jobs=2)
+    assert sorted(Path(f).name for f in d2h.rst_files) == ['one.rst', 'three.rst', 'two.rst']
+    assert list(d2h.rst_errors.keys()) == [str(path / 'bad.rst')]
+    assert (path / 'two.html').exists()
+
+    # file list updated to the compiled html and same-named images are dropped
+    assert sorted(Path(f.rel_path).name for f in d2h.files) == ['bad.rst', 'one.html', 'three.html', 'two.html']
+
+
+def test_convert_rst_cache(tmp_path, monkeypatch):
+    rst_file = tmp_path / 'cached.rst'
+    with open(rst_file, 'w') as output:
+        output.write('Cached\n======\n\nSome text\n')
+    cache = tmp_path / 'cache'
+    ph.convert_rst(rst_file, cache_dir=cache)
+    html = rst_file.with_suffix('.html').read_text()
+    assert len(os.listdir(cache)) == 1
+
+    # cache hit does not run docutils
+    def boom(*args, **kwargs):
+        raise RuntimeError('docutils called')
+    import docutils.core
+    monkeypatch.setattr(docutils.core, 'publish_string', boom)
+    os.remove(rst_file.with_suffix('.html'))
+    ph.convert_rst(rst_file, cache_dir=cache)
+    assert rst_file.with_suffix('.html').read_text() == html
+
+    # changed source misses the cache
+    with open(rst_file, 'a') as output:
+        output.write('\nMore text\n')
+    with pytest.raises(RuntimeError):
+        ph.convert_rst(rst_file, cache_dir=cache)
+
+    # eviction keeps the most recent entries
+    for ii in range(5):
+        (cache / f'{ii}.html').touch()
+    ph.evict_rst_cache(cache, 2)
+    assert len(os.listdir(cache)) == 2
+
+
+def test_convert_rst_missing_stylesheet(tmp_path, monkeypatch):
+    rst_file = tmp_path / 'plain.rst'
+    with open(rst_file, 'w') as output:
+        output.write('Plain\n=====\n\nSome text\n')
+
+    # the html is still written (docutils reports the missing stylesheet) and the source is only read once
+    reads = []
+    real_open = open
+
+    def counting_open(file, *args, **kwargs):
+        if str(file) == str(rst_file):
+            reads.append(file)
+        return real_open(file, *args, **kwargs)
+    monkeypatch.setattr('builtins.open', counting_open)
+    ph.convert_rst(rst_file, stylesheet=str(tmp_path / 'missing.css'), cache_dir=tmp_path / 'cache')
+    assert len(reads) == 1
+    assert 'Some text' in rst_file.with_suffix('.html').read_text()
+
+
+def test_convert_rst_subs(tmp_path):
+    rst_file = tmp_path / 'styled.rst'
+    with open(rst_file, 'w') as output:
+        output.write('Styled\n======\n\nSome text\n')
+    css = tmp_path / 'rst.css'
+    css.write_text('body { color: $RST_FONT_COLOR; }')
+    cache = tmp_path / 'cache'
+
+    # replacements are applied when the html is written but not stored in the cache
+    for ii in range(2):
+        ph.convert_rst(rst_file, stylesheet=str(css), cache_dir=cache, subs=[{'rst_font_color': 'red'}])
+        assert 'color: red;' in rst_file.with_suffix('.html').read_text()
+    assert '$RST_FONT_COLOR' in (cache / os.listdir(cache)[0]).read_text()
+
+
+def test_fix_rst_paths():
+    rst = '.. figure:: my plot.png\n\n.. image:: other plot.png\n\nA `link <some file.html>`_\n'
+    html = '<img alt="myplot.png" src="myplot.png" />\n<img alt="otherplot.png" src="otherplot.png" />\n' \
+           '<a class="reference external" href="somefile.html">link</a>'
+    fixed = ph.fix_rst_paths(rst, html)
+    assert 'alt="my plot.png" src="my plot.png"' in fixed
+    assert 'alt="other plot.png" src="other plot.png"' in fixed
+    assert 'href="some file.html"' in fixed
+
+
+def test_write_ul(tmp_path):
+    from xml.dom import minidom
+    from xml.etree import ElementTree
+
+    def pretty(d2h, **kwargs):
+        xml = minidom.parseString(ElementTree.tostring(d2h.tree_to_xml(d2h.tree)))
+        return xml.toprettyxml(**kwargs).replace('<?xml version="1.0" ?>' + kwargs.get('newl', '\n'), '')
+
+    for name in ['a & b', 'c "d" <e>', "f'g"]:
+        os.makedirs(tmp_path / name)
+        (tmp_path / name / f'{name} 1.png').write_bytes(b'')
+    (tmp_path / 'top.png').write_bytes(b'')
+
+    for kwargs in [{}, {'onclick': None}, {'use_relative': False}]:
+        kwargs = {'onclick': 'launch', 'onmouseover': 'div_switch', **kwargs}
+        d2h = ph.Dir2HTML(tmp_path, ext=['png'], **kwargs)
+        assert d2h.write_ul(io.StringIO()).getvalue() == pretty(d2h, indent='  ')
+        assert d2h.write_ul(io.StringIO()).getvalue().count('<li class="collapsed">') == 3
+        ul = d2h.write_ul(io.StringIO(), indent='    ', newl='\n' + ' ' * 12).getvalue()
+        assert ul == pretty(d2h, indent='    ', newl='\n' + ' ' * 12)
+
+
+def test_compile_exclude():
+    assert ph.compile_exclude([]) is None
+    assert ph.compile_exclude(['']) is None
+
+    regex = ph.compile_exclude(['index.html', 'a+b', 'glob:*.tmp', r're:run\d+/old'])
+    assert regex.search('/data/index.html')
+    assert regex.search('/data/a+b/plot.png')
+    assert not regex.search('/data/aab/plot.png')
+    assert regex.search('/data/plot.tmp')
+    assert not regex.search('/data/plot.tmp/plot.png')
+    assert regex.search('/data/run12/old/plot.png')
+    assert not regex.search('/data/run/old/plot.png')
+
+
+def test_dir2html_exclude():
+    d2h = ph.Dir2HTML(CUR_DIR / 'Example', ext=['jpg', 'png'], exclude=['BER', 'glob:*.jpg', 're:/nonexistent$'])
+    assert len(d2h.files) > 0
+    assert not any('BER' in f.full_path or f.ext == 'jpg' for f in d2h.files)
+
+
+@pytest.mark.parametrize('workers', [1, 4])
+def test_dir2html_prune(tmp_path, monkeypatch, workers):
+    for path in ['a/b/c', 'skip/deep', '.git/objects']:
+        os.makedirs(tmp_path / path)
+        (tmp_path / path / 'plot.png').write_bytes(b'')
+    (tmp_path / 'a' / 'plot.png').write_bytes(b'')
+
+    listed = []
+    scandir = ph.scandir
+
+    def spy(path):
+        listed.append(Path(path).name)
+        return scandir(path)
+
+    monkeypatch.setattr(ph, 'scandir', spy)
+    d2h = ph.Dir2HTML(tmp_path, ext=['png'], exclude=['skip', 'glob:*/.git/*'], scan_workers=workers)
+    expected = [os.path.join('a', 'b', 'c', 'plot.png'), os.path.join('a', 'plot.png')]
+    assert sorted(f.rel_path for f in d2h.files) == expected
+    assert not {'skip', 'deep', '.git', 'objects'} & set(listed)
+
+    listed.clear()
+    d2h = ph.Dir2HTML(tmp_path, ext=['png'], max_depth=1, scan_workers=workers, natsort=False)
+    assert sorted(f.rel_path for f in d2h.files) == [os.path.join('a', 'plot.png')]
+    assert sorted(listed) == sorted([tmp_path.name, 'a', 'skip', '.git'])
+
+
+def test_dir2html_prune_anchored(tmp_path):
+    # patterns anchored at the end of a path exclude files, not the directories they happen to match
+    for path in ['results.png/a.jpg', 'run_old/b.jpg', 'run_old/c_old']:
+        os.makedirs((tmp_path / path).parent, exist_ok=True)
+        (tmp_path / path).write_bytes(b'')
+    d2h = ph.Dir2HTML(tmp_path, ext=['jpg'], exclude=['glob:*.png'])
+    assert sorted(f.rel_path for f in d2h.files) == [os.path.join('results.png', 'a.jpg'),
+                                                     os.path.join('run_old', 'b.jpg')]
+    d2h = ph.Dir2HTML(tmp_path, ext=['jpg'], exclude=['re:_old$'])
+    assert sorted(f.rel_path for f in d2h.files) == [os.path.join('results.png', 'a.jpg'),
+                                                     os.path.join('run_old', 'b.jpg')]
+
+
+def test_tree_to_json():
+    def decode(items, parent=''):
+        prefix = parent + '/' if parent else ''
+        for item in items:
+            if isinstance(item, str):
+                yield os.path.splitext(item)[0], prefix + item
+            elif isinstance(item, list):
+                yield os.path.splitext(item[0])[0], item[1]
+            else:
+                path = item.get('p', prefix + item['n'])
+                yield item['n'], path
+                yield from decode(item['c'], path)
+
+    for relative in [True, False]:
+        d2h = ph.Dir2HTML(CUR_DIR / 'Example', ext=['jpg', 'png', 'html'], use_relative=relative)
+        expected = []
+        for node in [d2h.tree] + list(d2h.tree.nodes()):
+            expected += [(f.filename, f.html_path) for f in node.files]
+            expected += [(f.name, f.path) for f in node.children.values()]
+        assert sorted(decode(d2h.tree_to_json())) == sorted(expected)
+
+    # relative paths are not repeated
+    d2h = ph.Dir2HTML(CUR_DIR / 'Example', ext=['png'])
+    children = d2h.tree_to_json(d2h.tree.children['Data Files'], 'Data Files')
+    assert d2h.tree_to_json()[0] == {'n': 'Data Files', 'c': children}
+
+
+def test_search_index():
+    d2h = ph.Dir2HTML(CUR_DIR / 'Example', ext=['jpg', 'png', 'html'])
+    index = d2h.search_index()
+    assert index['n'] == 3
+    assert index['paths'] == [f.rel_path.replace(os.sep, '/').lower() for f in d2h.tree.records()]
+    assert 'data files/ber/eye_diagrams.png' in index['paths']
+
+    # postings are stored as differences from the previous file number
+    for gram in ['ber', 'png', 'ata']:
+        ids = [i for i, f in enumerate(index['paths']) if gram in f]
+        assert index['grams'][gram] == [ids[0]] + [b - a for a, b in zip(ids[:-1], ids[1:])]
+
+
+def test_write_ul_compact():
+    import bs4
+    kwargs = {'ext': ['jpg', 'png', 'html'], 'onclick': 'window.open', 'onmouseover': 'div_switch'}
+    full = ph.Dir2HTML(CUR_DIR / 'Example', **kwargs)
+    compact = ph.Dir2HTML(CUR_DIR / 'Example', compact=True, **kwargs)
+    html = compact.write_ul(io.StringIO()).getvalue()
+    assert html.startswith('<ul id="collapse" data-onmouseover="div_switch" data-onclick="window.open">\n')
+    assert ' onmouseover="' not in html and 'href=' not in html
+    assert len(html) < len(full.write_ul(io.StringIO()).getvalue()) / 2
+
+    # same list structure and paths
+    soup = bs4.BeautifulSoup(html, 'html.parser')
+    links = soup.find_all('a')
+    files = [a for a in links if 'collapsed' not in a.parent.get('class', [])]
+    assert [a['data-path'] for a in files] == [f.html_path for f in full.tree.records()]
+    assert [a.text for a in files] == [f.filename for f in full.tree.records()]
+    assert len(soup.find_all('li', {'class': 'collapsed'})) == len(list(full.tree.nodes()))
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_companion_paths(tmp_path, workers):
+    os.makedirs(tmp_path / 'sub')
+    for name in ['plot.png', 'plot.html', 'other.png', 'page.html', 'sub/deep.jpg', 'sub/deep.html']:
+        (tmp_path / name).write_bytes(b'')
+    d2h = ph.Dir2HTML(tmp_path, ext=['png', 'jpg', 'html'], scan_workers=workers)
+    assert sorted(d2h.companion_paths()) == ['plot.png', 'sub/deep.jpg']
+    assert not any(f.companion for f in d2h.files if f.ext == 'html')
+
+
+def test_file_tokens(tmp_path):
+    for name in ['a.png', 'b.png', 'page.html']:
+        (tmp_path / name).write_bytes(name.encode('utf-8'))
+    d2h = ph.Dir2HTML(tmp_path, ext=['png', 'html'])
+    tokens = d2h.file_tokens()
+    assert tokens['paths'] == [f.html_path for f in d2h.tree.records()]
+    assert tokens['tokens'][tokens['paths'].index('page.html')] == ''
+    assert all(len(tokens['tokens'][tokens['paths'].index(f)]) == 8 for f in ['a.png', 'b.png'])
+
+    # same result from a thread pool when the scan stats are missing
+    d2h.stats = {}
+    assert d2h.file_tokens() == tokens
+
+    # content hashes only change with the contents
+    hashes = d2h.file_tokens(content=True)
+    os.utime(tmp_path / 'a.png', ns=(0, 0))
+    assert d2h.file_tokens(content=True) == hashes
+    assert d2h.file_tokens() != tokens
+    (tmp_path / 'a.png').write_bytes(b'new')
+    assert d2h.file_tokens(content=True) != hashes
@@ -0,0 +1,73 @@
+import os
+import pytest
+import shutil
+import pywebify
+from pathlib import Path
+pm = pywebify.manifest
+CUR_DIR = Path(os.path.dirname(__file__))
+
+
+def test_digest():
+    assert pm.digest({'a': 1}) == pm.digest({'a': 1})
+    assert pm.digest({'a': 1}) != pm.digest({'a': 2})
+    assert pm.digest({'now': '12:00'}, ignore=['12:00']) == pm.digest({'now': '13:00'}, ignore=['13:00'])
+
+
+def test_unchanged(tmp_path):
+    src = tmp_path / 'src.txt'
+    dest = tmp_path / 'dest.txt'
+    src.write_text('hi')
+    dest.write_text('there')
+    mm = pm.BuildManifest(tmp_path / 'manifest.json')
+    assert not mm.unchanged('step', [src], [dest])
+    mm.record('step', [src], [dest], 'abc')
+    mm.save()
+
+    mm = pm.BuildManifest(tmp_path / 'manifest.json')
+    assert mm.unchanged('step', [src], [dest], 'abc')
+    assert not mm.unchanged('step', [src], [dest], 'xyz')
+    src.write_text('hi again')
+    assert not mm.unchanged('step', [src], [dest], 'abc')
+
+    # signature mismatch invalidates everything
+    mm = pm.BuildManifest(tmp_path / 'manifest.json', signature='new options')
+    assert mm.old['entries'] == {}
+
+
+@pytest.mark.parametrize('engine', ['string', 'jinja'])
+def test_incremental_report(tmp_path, monkeypatch, engine):
+    example = tmp_path / 'Example'
+    shutil.copytree(CUR_DIR / 'Example', example)
+    config = str(CUR_DIR / 'config_with_index.ini')
+    pw = pywebify.PyWebify(example, config=config, open=False, incremental=True, template_engine=engine)
+    assert (pw.setup_path / 'manifest.json').exists()
+    assert pw.files.rst_reused == []
+    report = pw.report_path / f'{pw.report_filename}.html'
+    mtime = os.stat(report).st_mtime_ns
+
+    # nothing changed so nothing is rebuilt (or rendered in to one string for the digest)
+    def render(self):
+        raise AssertionError('sidebar rendered')
+    monkeypatch.setattr(pywebify.template.Chunks, '__str__', render)
+    pw = pywebify.PyWebify(example, config=config, open=False, incremental=True, template_engine=engine)
+    assert len(pw.files.rst_reused) == 2
+    assert os.stat(report).st_mtime_ns == mtime
+
+    # a new file rebuilds the report
+    shutil.copy(example / 'Microscopy' / 'mzis.jpg', example / 'Microscopy' / 'mzis2.jpg')
+    monkeypatch.undo()
+    pw = pywebify.PyWebify(example, config=config, open=False, incremental=True, template_engine=engine)
+    with open(report, 'r') as input:
+        assert 'mzis2' in input.read()
+
+
+def test_content_hash(tmp_path):
+    mm = pm.BuildManifest(tmp_path / 'manifest.json')
+    assert mm.content_hash('a.png', [1, 2]) is None
+    mm.record_hash('a.png', [1, 2], 'abc')
+    mm.save()
+
+    mm = pm.BuildManifest(tmp_path / 'manifest.json')
+    assert mm.content_hash('a.png', [1, 2]) == 'abc'
+    assert mm.content_hash('a.png', [1, 3]) is None
+    assert mm.data['hashes'] == {'a.png': [1, 2, 'abc']}
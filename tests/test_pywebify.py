@@ -2,6 +2,8 @@ import pytest
 import os
 import pywebify
 import importlib
+import subprocess
+import sys
 import bs4
 from pathlib import Path
 CUR_DIR = Path(os.path.dirname(__file__))
@@ -138,10 +140,112 @@ def test_init_make_setup():
     os.remove(setup)
     assert not setup.exists()
 
+    # no import-time side effects
     importlib.reload(pywebify)
-    assert setup.exists()
-
-    os.remove(setup)
     assert not setup.exists()
+
     pywebify.get_config()
     assert setup.exists()
+
+
+def test_import_is_lazy():
+    # heavy dependencies are only loaded on first use
+    code = 'import sys, pywebify; print(",".join(sorted(sys.modules)))'
+    env = dict(os.environ, PYTHONPATH=str(Path(pywebify.__file__).parents[1]))
+    modules = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True,
+                             env=env).stdout.strip().split(',')
+    for mod in ['pandas', 'numpy', 'docutils', 'natsort', 'pdb', 'concurrent.futures', 'subprocess']:
+        assert mod not in modules
+
+
+def test_import_time(benchmark):
+    env = dict(os.environ, PYTHONPATH=str(Path(pywebify.__file__).parents[1]))
+    benchmark.pedantic(subprocess.run, args=([sys.executable, '-c', 'import pywebify'], ),
+                       kwargs={'check': True, 'env': env}, rounds=5)
+
+
+def test_lazy_sidebar():
+    import json
+    pw = pywebify.PyWebify('tests/Example', config='tests/config_with_index.ini', open=False, lazy_sidebar=True)
+
+    with open(str(pw.report_path / pw.report_filename) + '.html', 'r') as input:
+        report = input.read()
+    assert '<ul id="collapse"></ul>' in report
+    assert '<li>' not in report
+    assert f'src="pywebify/css/{pw.report_filename}_sidebar.js"></script>' in report
+    assert f'src="pywebify/css/{pw.report_filename}_search.js" async></script>' in report
+    assert (pw.setup_path / 'css' / f'{pw.report_filename}_search.js').exists()
+    assert 'src="pywebify/js/sidebar.js"' in report
+    assert (pw.setup_path / 'js' / 'sidebar.js').exists()
+
+    # the json tree is wrapped in a script
+    sidebar = pw.setup_path / 'css' / f'{pw.report_filename}_sidebar.js'
+    with open(sidebar, 'r') as input:
+        text = input.read()
+    assert text.startswith('var pywebifySidebar = JSON.parse(')
+    tree = json.loads(json.loads(text[len('var pywebifySidebar = JSON.parse('):-len(');\n')]))
+    assert tree['onmouseover'] == 'div_switch'
+    assert tree['tree'] == pw.files.tree_to_json()
+
+    # unchanged trees are not rewritten
+    mtime = os.stat(sidebar).st_mtime_ns
+    pw.build_sidebar()
+    assert os.stat(sidebar).st_mtime_ns == mtime
+
+
+def test_compact_sidebar():
+    pw = pywebify.PyWebify('tests/Example', config='tests/config_with_index.ini', open=False, compact_sidebar=True)
+    with open(str(pw.report_path / pw.report_filename) + '.html', 'r') as input:
+        report = input.read()
+    assert '<ul id="collapse" data-onmouseover="div_switch" data-onclick="window.open">' in report
+    assert 'data-path="Data Files/BER/eye_diagrams.png"' in report
+    assert "onmouseover=\"div_switch('" not in report
+
+
+def test_companions():
+    import json
+    pw = pywebify.PyWebify('tests/Example', config='tests/config_with_index.ini', open=False)
+
+    with open(str(pw.report_path / pw.report_filename) + '.html', 'r') as input:
+        report = input.read()
+    assert f'src="pywebify/css/{pw.report_filename}_companions.js"></script>' in report
+
+    with open(pw.setup_path / 'css' / f'{pw.report_filename}_companions.js', 'r') as input:
+        text = input.read()
+    companions = json.loads(json.loads(text[len('var pywebifyCompanions = JSON.parse('):-len(');\n')]))
+    assert companions == pw.files.companion_paths()
+    assert all(os.path.exists(pw.base_path / (os.path.splitext(f)[0] + '.html')) for f in companions)
+
+
+def test_cache_token():
+    pw = pywebify.PyWebify('tests/Example', config='tests/config_with_index.ini', open=False)
+    with open(str(pw.report_path / pw.report_filename) + '.html', 'r') as input:
+        report = input.read()
+    assert f'src="pywebify/css/{pw.report_filename}_tokens.js"></script>' in report
+    assert (pw.setup_path / 'css' / f'{pw.report_filename}_tokens.js').exists()
+
+    pw = pywebify.PyWebify('tests/Example', config='tests/config_with_index.ini', open=False, cache_token=None)
+    with open(str(pw.report_path / pw.report_filename) + '.html', 'r') as input:
+        assert '_tokens.js' not in input.read()
+
+
+def test_template_engine(tmp_path):
+    pytest.importorskip('jinja2')
+    reports = []
+    for engine in ['string', 'jinja']:
+        pw = pywebify.PyWebify('tests/Example', config='tests/config_with_index.ini', open=False,
+                               template_engine=engine)
+        with open(str(pw.report_path / pw.report_filename) + '.html', 'r') as input:
+            reports += [input.read()]
+    assert reports[0] == reports[1]
+    assert (pw.setup_path / 'jinja_cache').exists()
+
+
+def test_launch_server(tmp_path, monkeypatch):
+    import pywebify.server
+    calls = []
+    monkeypatch.setattr(pywebify.server, 'serve', lambda *args, **kwargs: calls.append((args, kwargs)))
+    (tmp_path / 'plot.png').write_bytes(b'')
+    pywebify.PyWebify(tmp_path, config='tests/config_with_index.ini', make=False, open=False, serve=True,
+                      serve_connections=4, serve_workers=2).launch_server()
+    assert calls[0][1]['max_connections'] == 4 and calls[0][1]['workers'] == 2
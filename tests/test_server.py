@@ -0,0 +1,130 @@
+import asyncio
+import gzip
+import http.client
+import threading
+import pytest
+import pywebify.server as ps
+from pathlib import Path
+
+
+async def cancel(tasks):
+    # stop the handlers of any open connections
+    for tt in tasks:
+        tt.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def running(srv):
+    loop = asyncio.new_event_loop()
+    loop.run_until_complete(srv.start())
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    yield srv
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join()
+    srv.close()
+    loop.run_until_complete(cancel(asyncio.all_tasks(loop)))
+    loop.close()
+
+
+@pytest.fixture
+def server(tmp_path):
+    (tmp_path / 'report.html').write_text('<html>' + 'pywebify ' * 500 + '</html>')
+    (tmp_path / 'plot.png').write_bytes(bytes(range(256)) * 40)
+    (tmp_path / 'sub').mkdir()
+    (tmp_path / 'secret.txt').write_text('secret')
+    yield from running(ps.ReportServer(tmp_path, port=0, index='report.html', workers=2))
+
+
+@pytest.fixture
+def store_server(tmp_path):
+    (tmp_path / 'share').mkdir()
+    (tmp_path / 'share' / 'report.html').write_text('<html></html>')
+    (tmp_path / 'static').mkdir()
+    (tmp_path / 'static' / 'jquery.0123456789abcdef.js').write_text('var jquery = 1;')
+    (tmp_path / 'share' / 'plot.0123456789abcdef.png').write_bytes(b'plot')
+    yield from running(ps.ReportServer(tmp_path / 'share', port=0, index='report.html', workers=2,
+                                       asset_store=tmp_path / 'static', asset_store_url='/pywebify-assets/'))
+
+
+def request(srv, path, method='GET', **headers):
+    conn = http.client.HTTPConnection(srv.host, srv.port, timeout=10)
+    conn.request(method, path, headers=headers)
+    resp = conn.getresponse()
+    body = resp.read()
+    conn.close()
+    return resp, body
+
+
+def test_byte_range():
+    assert ps.byte_range('bytes=0-9', 100) == (0, 9)
+    assert ps.byte_range('bytes=90-', 100) == (90, 99)
+    assert ps.byte_range('bytes=-10', 100) == (90, 99)
+    assert ps.byte_range('bytes=50-500', 100) == (50, 99)
+    assert ps.byte_range('bytes=100-', 100) is False
+    assert ps.byte_range('bytes=0-1,5-6', 100) is None
+    assert ps.byte_range('items=0-1', 100) is None
+
+
+def test_accept_encoding():
+    assert ps.accept_encoding('gzip, deflate, br;q=0') == ['gzip', 'deflate']
+    assert ps.accept_encoding('') == []
+
+
+def test_serve_files(server):
+    resp, body = request(server, '/')
+    assert resp.status == 200 and body.startswith(b'<html>')
+    assert resp.getheader('Content-Encoding') is None
+
+    # compressed text with revalidation
+    resp, body = request(server, '/report.html?id=plot', **{'Accept-Encoding': 'gzip'})
+    assert resp.getheader('Content-Encoding') == 'gzip'
+    assert gzip.decompress(body).startswith(b'<html>')
+    etag = resp.getheader('ETag')
+    resp, body = request(server, '/report.html', **{'If-None-Match': etag})
+    assert resp.status == 304 and body == b''
+
+    # images are not compressed and support byte ranges
+    resp, body = request(server, '/plot.png', **{'Accept-Encoding': 'gzip'})
+    assert resp.status == 200 and len(body) == 10240 and resp.getheader('Content-Encoding') is None
+    assert resp.getheader('Cache-Control') == 'no-cache'
+    resp, part = request(server, '/plot.png?v=abc', Range='bytes=256-511')
+    assert resp.status == 206 and part == body[256:512]
+    assert resp.getheader('Content-Range') == 'bytes 256-511/10240'
+    assert 'immutable' in resp.getheader('Cache-Control')
+    assert request(server, '/plot.png?dev=1')[0].getheader('Cache-Control') == 'no-cache'
+    resp, _ = request(server, '/plot.png', Range='bytes=20000-')
+    assert resp.status == 416
+
+    # changed files get a new etag
+    (Path(server.root) / 'plot.png').write_bytes(b'new')
+    resp, body = request(server, '/plot.png', **{'If-None-Match': etag})
+    assert resp.status == 200 and body == b'new'
+
+    resp, body = request(server, '/plot.png', method='HEAD')
+    assert resp.getheader('Content-Length') == '3' and body == b''
+
+
+def test_serve_errors(server):
+    assert request(server, '/missing.png')[0].status == 404
+    assert request(server, '/../secret.txt')[0].status == 404
+    assert request(server, '/sub/%2e%2e/%2e%2e/etc/passwd')[0].status == 404
+    assert request(server, '/report.html', method='POST')[0].status == 405
+
+    # the unread body of a request ends the connection
+    conn = http.client.HTTPConnection(server.host, server.port, timeout=10)
+    conn.request('POST', '/report.html', body=b'GET /secret.txt HTTP/1.1\r\n\r\n')
+    resp = conn.getresponse()
+    assert resp.status == 405 and resp.getheader('Connection') == 'close'
+    conn.close()
+
+
+def test_serve_asset_store(store_server):
+    resp, body = request(store_server, '/pywebify-assets/jquery.0123456789abcdef.js')
+    assert resp.status == 200 and body == b'var jquery = 1;'
+    assert 'immutable' in resp.getheader('Cache-Control')
+    resp, body = request(store_server, '/plot.0123456789abcdef.png')
+    assert resp.status == 200 and resp.getheader('Cache-Control') == 'no-cache'
+    assert request(store_server, '/report.html')[0].status == 200
+    assert request(store_server, '/pywebify-assets/../share/report.html')[0].status == 404
+    assert request(store_server, '/pywebify-assets-old/jquery.0123456789abcdef.js')[0].status == 404
@@ -0,0 +1,112 @@
+import io
+import os
+import pytest
+import string
+import pywebify
+import pywebify.template as pt
+from pathlib import Path
+CUR_DIR = Path(os.path.dirname(__file__))
+
+
+def test_compile_template():
+    text = 'a $NAME ${BRACED}b $$ $missing $1 cost: $ end $'
+    subs = {'NAME': 'x', 'BRACED': 3, 'missing_not': 'y'}
+    tmpl = pywebify.Template([], subs)
+    output = []
+
+    class Stream():
+        write = output.append
+
+    tmpl.render(Stream(), caps=False, parts=pt.compile_template(text))
+    assert ''.join(output) == string.Template(text).safe_substitute(subs) + '\n'
+
+
+def test_template_cache(tmp_path):
+    path = tmp_path / 'page.html'
+    path.write_text('<title>$TITLE</title>')
+    cache = pt.TEMPLATE_CACHE
+    misses = cache.misses
+
+    # the file is compiled once
+    assert pywebify.Template(path, {'title': 'one'}).write() == '<title>one</title>\n'
+    assert pywebify.Template(path, {'title': 'two'}).write() == '<title>two</title>\n'
+    assert cache.misses == misses + 1
+
+    # changed files are reloaded
+    path.write_text('<h1>$TITLE</h1>')
+    os.utime(path, ns=(0, 0))
+    assert pywebify.Template(path, {'title': 'three'}).write() == '<h1>three</h1>\n'
+    assert cache.misses == misses + 2
+
+    pt.clear_template_cache(path)
+    assert str(path) not in cache.entries
+
+    # bounded size
+    small = pt.TemplateCache(max_size=2)
+    for name in 'abc':
+        (tmp_path / name).write_text(name)
+        small.get(tmp_path / name)
+    assert list(small.entries.keys()) == [str(tmp_path / 'b'), str(tmp_path / 'c')]
+
+
+def test_template_write_in_place(tmp_path):
+    # a template can be rendered over itself
+    path = tmp_path / 'rst.html'
+    path.write_text('color: $COLOR;')
+    pywebify.Template(path, {'color': 'red'}, cache=False).write(dest=path)
+    assert path.read_text() == 'color: red;\n'
+
+
+def test_jinja_engine(tmp_path):
+    pytest.importorskip('jinja2')
+    path = tmp_path / 'page.html'
+    path.write_text('<ul>{% for ff in files %}<li>{{ ff }}</li>{% endfor %}</ul> {{ TITLE }}')
+    chunks = []
+
+    class Stream():
+        write = chunks.append
+
+    tmpl = pywebify.Template(path, {'files': ['a', 'b'], 'title': 'Report'}, engine='jinja',
+                             bytecode_cache=tmp_path / 'jinja_cache')
+    tmpl.render(Stream())
+    assert ''.join(chunks) == '<ul><li>a</li><li>b</li></ul> Report\n'
+    assert len(chunks) > 2  # streamed
+    assert len(os.listdir(tmp_path / 'jinja_cache')) == 1
+
+    # changed files are reloaded
+    path.write_text('<p>{{ TITLE }}</p>')
+    os.utime(path, ns=(0, 0))
+    assert tmpl.write() == '<p>Report</p>\n'
+
+
+@pytest.fixture(scope='module')
+def big_tree(tmp_path_factory):
+    path = tmp_path_factory.mktemp('big')
+    for ii in range(100):
+        os.makedirs(path / f'run{ii}')
+        for jj in range(100):
+            (path / f'run{ii}' / f'plot {jj}.png').touch()
+    return pywebify.html.Dir2HTML(path, ['png'], onmouseover='div_switch', onclick='div_switch')
+
+
+@pytest.mark.parametrize('engine', ['string', 'jinja'])
+def test_render_benchmark(benchmark, big_tree, tmp_path, engine):
+    # sidebar of 10k files: the string engine builds it as one string, jinja streams the chunks of iter_ul
+    if engine == 'jinja':
+        pytest.importorskip('jinja2')
+    src = (CUR_DIR.parent / 'src' / 'pywebify' / 'templates').resolve()
+    path = src / ('html' if engine == 'string' else 'jinja') / 'webify.html'
+    kwargs = {'indent': '    ', 'newl': '\n' + ' ' * 12}
+
+    def render():
+        if engine == 'jinja':
+            sidebar = pt.Chunks(big_tree.iter_ul, **kwargs)
+        else:
+            sidebar = big_tree.write_ul(io.StringIO(), **kwargs).getvalue()
+        tmpl = pywebify.Template(path, {'sidebar': sidebar, 'title': 'Benchmark'}, engine=engine,
+                                 bytecode_cache=tmp_path / 'jinja_cache')
+        tmpl.write(dest=tmp_path / 'report.html')
+
+    benchmark(render)
+    report = (tmp_path / 'report.html').read_text()
+    assert 'plot 99.png' in report and report.count('<li>') == 10000